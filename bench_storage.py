@@ -0,0 +1,90 @@
+"""
+Сравнение форматов хранения: base58 TEXT (rowid-таблицы) и BLOB WITHOUT ROWID.
+
+Создает базу старого формата с N подписями и кошельками, замеряет размер файла
+и скорость проверок is_transaction_processed / is_wallet_notified, затем выполняет
+автоматическую миграцию init_db() и повторяет замеры. Для BLOB запросы идут дважды:
+с пустым кэшем b58decode (новые ключи) и повторно (проход снова проверяет те же
+последние подписи источников).
+
+    python bench_storage.py            # 100000 записей
+    python bench_storage.py 500000
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+
+import tracker
+
+
+def create_legacy_db(path, count):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE sources (address TEXT PRIMARY KEY)")
+    cursor.execute("CREATE TABLE processed_txs (signature TEXT PRIMARY KEY, timestamp INTEGER)")
+    cursor.execute("CREATE TABLE notified_wallets (wallet_address TEXT PRIMARY KEY)")
+
+    now = int(time.time())
+    signatures = [tracker.b58encode(random.randbytes(64)) for _ in range(count)]
+    wallets = [tracker.b58encode(random.randbytes(32)) for _ in range(count)]
+    cursor.executemany("INSERT INTO processed_txs VALUES (?, ?)", [(s, now) for s in signatures])
+    cursor.executemany("INSERT INTO notified_wallets VALUES (?)", [(w,) for w in wallets])
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    return signatures, wallets
+
+
+def lookup(conn, query, keys, encode):
+    start = time.perf_counter()
+    for key in keys:
+        assert conn.execute(query, (encode(key),)).fetchone() is not None
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def measure(label, path, signatures, wallets, encode):
+    # Запросы идут через одно соединение, чтобы сравнивать именно поиск по ключу;
+    # для BLOB в замер входит декодирование base58 на границе
+    conn = sqlite3.connect(path)
+    queries = (
+        ("SELECT 1 FROM processed_txs WHERE signature = ?", signatures),
+        ("SELECT 1 FROM notified_wallets WHERE wallet_address = ?", wallets),
+    )
+    tracker.b58decode.cache_clear()
+    cold = [lookup(conn, query, keys, encode) for query, keys in queries]
+    warm = [lookup(conn, query, keys, encode) for query, keys in queries]
+    conn.close()
+
+    size = os.path.getsize(path)
+    print(f"{label:<5} размер файла: {size / 1024 / 1024:8.2f} МБ   "
+          f"processed_txs: {cold[0]:6.1f} / {warm[0]:5.1f} мкс/запрос   "
+          f"notified_wallets: {cold[1]:6.1f} / {warm[1]:5.1f} мкс/запрос (новые / повторные ключи)")
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    lookups = min(count, 5000)
+
+    with tempfile.TemporaryDirectory() as directory:
+        tracker.DB_PATH = os.path.join(directory, "bench.db")
+        print(f"Записей: {count} подписей и {count} кошельков, запросов: {lookups}")
+        signatures, wallets = create_legacy_db(tracker.DB_PATH, count)
+        sample_sigs = random.sample(signatures, lookups)
+        sample_wallets = random.sample(wallets, lookups)
+
+        size_before = measure("TEXT", tracker.DB_PATH, sample_sigs, sample_wallets, lambda key: key)
+
+        start = time.perf_counter()
+        tracker.init_db()
+        print(f"Миграция init_db(): {time.perf_counter() - start:.2f} с")
+
+        size_after = measure("BLOB", tracker.DB_PATH, sample_sigs, sample_wallets, tracker.b58decode)
+        print(f"Размер после миграции: {size_after / size_before:.0%} от исходного")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,6 @@
-import sqlite3
 import asyncio
-import aiohttp
 import logging
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
 from telegram import Update
 from telegram.ext import (
     Application,
@@ -13,506 +11,299 @@ from telegram.ext import (
     ConversationHandler,
     JobQueue
 )
-import re
-import json
-
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+from telegram.error import RetryAfter
+from telegram.helpers import escape_markdown
+import argparse
+
+import tracker
+from tracker import (
+    clear_test_data,
+    get_settings,
+    update_setting,
+    add_source_address,
+    delete_source_address,
+    get_source_addresses,
+    is_wallet_notified,
+    mark_wallet_notified,
+    unmark_wallet_notified,
+    add_pending_alert,
+    get_pending_alerts,
+    delete_pending_alert,
+    get_signature_statuses,
+    is_valid_solana_address,
+    transfer_graph,
+    label_registry,
+    token_registry,
+    set_token_range,
+    delete_token,
+    refresh_token_metadata,
+    parse_labels,
+    import_labels,
+    subscription_index,
+    subscribe_chat,
+    unsubscribe_chat,
+    get_chat_subscriptions,
+    update_subscriber,
+    fetch_detections,
+    delete_detections,
+    run_check_pass,
+    pass_profiler,
+    run_worker,
+    CHECK_INTERVAL,
+    MAX_SUBSCRIPTIONS_PER_CHAT,
+    ALERT_DROP_TIMEOUT
 )
+
 logger = logging.getLogger(__name__)
 
 # Константы состояний для ConversationHandler
-ADD_SOURCE, DELETE_SOURCE, SET_RANGE_MIN, SET_RANGE_MAX, SET_TIMEZONE, SET_NOTIFICATION_MODE = range(6)
-SOLANA_RPC_URL = "https://api.devnet.solana.com"  # SOLANA_RPC_URL = "https://api.mainnet-beta.solana.com"
-DB_PATH = "solana_tracker.db"
+ADD_SOURCE, DELETE_SOURCE, SET_RANGE_MIN, SET_RANGE_MAX, SET_TIMEZONE, SET_NOTIFICATION_MODE, IMPORT_SOURCES = range(7)
+LIST_LIMIT = 50  # Сколько адресов показывать в одном сообщении (лимит Telegram — 4096 символов)
+MESSAGE_LIMIT = 3900  # Длина сообщения с запасом до лимита Telegram (считается до разбора Markdown)
 
 # ВАЖНО: ЗАМЕНИТЕ ЭТИ ЗНАЧЕНИЯ НА СВОИ РЕАЛЬНЫЕ ДАННЫЕ
 ADMIN_USER_ID = 5974263434  # Убедитесь, что это ваш правильный ID
 BOT_TOKEN = "]"  # Убедитесь, что токен действителен
 
 
-# Инициализация базы данных
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Таблица адресов-источников
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS sources (
-        address TEXT PRIMARY KEY
-    )
-    ''')
-
-    # Таблица обработанных транзакций
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS processed_txs (
-        signature TEXT PRIMARY KEY,
-        timestamp INTEGER
-    )
-    ''')
+# Ограничение частоты отправки сообщений в Telegram
+class ChatRateLimiter:
+    """
+    Резервирует время отправки с учетом лимитов Telegram:
+    не чаще одного сообщения в секунду в один чат и не более 30 сообщений в секунду всего.
+    """
 
-    # Таблица уведомленных кошельков
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS notified_wallets (
-        wallet_address TEXT PRIMARY KEY
-    )
-    ''')
+    def __init__(self, per_chat_interval=1.0, global_rate=30):
+        self.per_chat_interval = per_chat_interval
+        self.global_interval = 1 / global_rate
+        self.next_global = 0.0
+        self.next_chat = {}
 
-    # Таблица настроек
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS settings (
-        key TEXT PRIMARY KEY,
-        value TEXT
-    )
-    ''')
-
-    # Инициализация настроек по умолчанию
-    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('min_amount', '0.001')")
-    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('max_amount', '10')")
-    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('timezone', '5')")
-    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('notify_all_transactions', 'true')")
-
-    conn.commit()
-    conn.close()
-
-
-# Очистка тестовых данных
-def clear_test_data():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM processed_txs")
-    cursor.execute("DELETE FROM notified_wallets")
-    conn.commit()
-    conn.close()
-    logger.info("✅ Тестовые данные очищены")
-
-
-# Получение настроек из БД
-def get_settings():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT key, value FROM settings")
-    settings = {row[0]: row[1] for row in cursor.fetchall()}
-    conn.close()
-    return settings
-
-
-# Обновление настроек в БД
-def update_setting(key, value):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
-    conn.commit()
-    conn.close()
-
-
-# Работа с адресами-источниками
-def add_source_address(address):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("INSERT OR IGNORE INTO sources (address) VALUES (?)", (address,))
-        conn.commit()
-        return True
-    except sqlite3.Error as e:
-        logger.error(f"Ошибка добавления адреса: {e}")
-        return False
-    finally:
-        conn.close()
+    async def wait(self, chat_id):
+        # Резервирование без await, поэтому конкурирующие задачи не получат одно и то же окно
+        now = asyncio.get_running_loop().time()
+        send_at = max(now, self.next_global, self.next_chat.get(chat_id, 0.0))
+        self.next_global = send_at + self.global_interval
+        self.next_chat[chat_id] = send_at + self.per_chat_interval
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
 
 
-def delete_source_address(address):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("DELETE FROM sources WHERE address = ?", (address,))
-        conn.commit()
-        return cursor.rowcount > 0
-    except sqlite3.Error as e:
-        logger.error(f"Ошибка удаления адреса: {e}")
-        return False
-    finally:
-        conn.close()
-
-
-def get_source_addresses():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT address FROM sources")
-    addresses = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return addresses
-
-
-# Проверка обработки транзакции
-def is_transaction_processed(signature):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM processed_txs WHERE signature = ?", (signature,))
-    result = cursor.fetchone()
-    conn.close()
-    return result is not None
-
-
-def mark_transaction_processed(signature):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR IGNORE INTO processed_txs (signature, timestamp) VALUES (?, ?)",
-                   (signature, int(datetime.now().timestamp())))
-    conn.commit()
-    conn.close()
-
-
-# Проверка уведомления о кошельке
-def is_wallet_notified(wallet_address):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM notified_wallets WHERE wallet_address = ?", (wallet_address,))
-    result = cursor.fetchone()
-    conn.close()
-    return result is not None
-
-
-def mark_wallet_notified(wallet_address):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR IGNORE INTO notified_wallets (wallet_address) VALUES (?)",
-                   (wallet_address,))
-    conn.commit()
-    conn.close()
-
-
-# Валидация адреса Solana
-def is_valid_solana_address(address):
-    return re.match(r'^[1-9A-HJ-NP-Za-km-z]{32,44}$', address) is not None
-
-
-# Получение исходящих транзакций с адреса
-async def get_outgoing_transactions(address, before=None):
-    payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "getSignaturesForAddress",
-        "params": [
-            address,
-            {
-                "limit": 10,
-                "before": before
-            }
-        ]
-    }
+rate_limiter = ChatRateLimiter()
 
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(SOLANA_RPC_URL, json=payload, timeout=10) as response:
-                if response.status != 200:
-                    logger.error(f"Ошибка получения транзакций: HTTP {response.status}")
-                    logger.error(f"Ответ: {await response.text()}")
-                    return []
-                result = await response.json()
-                return result.get('result', [])
-    except Exception as e:
-        logger.error(f"Ошибка получения транзакций для {address}: {e}")
-        return []
-
-
-# Получение деталей транзакции
-async def get_transaction_details(signature):
-    payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "getTransaction",
-        "params": [
-            signature,
-            {
-                "encoding": "json",
-                "commitment": "confirmed",
-                "maxSupportedTransactionVersion": 0
-            }
-        ]
-    }
 
+async def send_limited(context: ContextTypes.DEFAULT_TYPE, chat_id, **kwargs):
+    await rate_limiter.wait(chat_id)
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(SOLANA_RPC_URL, json=payload, timeout=10) as response:
-                if response.status != 200:
-                    logger.error(f"Ошибка получения деталей транзакции: HTTP {response.status}")
-                    logger.error(f"Ответ: {await response.text()}")
-                    return None
-                result = await response.json()
-                return result.get('result')
-    except Exception as e:
-        logger.error(f"Ошибка получения деталей транзакции {signature}: {e}")
-        return None
-
-
-# Отправка уведомления в Telegram
-async def send_notification(context: ContextTypes.DEFAULT_TYPE, wallet, amount, source, timestamp):
-    # Получаем настройки для отображения времени в правильном часовом поясе
-    settings = get_settings()
-    tz_offset = int(settings.get('timezone', '0'))
-    tz = timezone(timedelta(hours=tz_offset))
-
-    # Форматируем время
+        return await context.bot.send_message(chat_id=chat_id, **kwargs)
+    except RetryAfter as e:
+        # Telegram сам сообщил, сколько ждать — повторяем один раз
+        delay = e.retry_after
+        await asyncio.sleep(delay.total_seconds() if isinstance(delay, timedelta) else delay)
+        return await context.bot.send_message(chat_id=chat_id, **kwargs)
+
+
+# Адрес с меткой из реестра (биржа и т.п.), если она есть
+def labelled(address):
+    label = label_registry.get(address)
+    return f"`{address}` ({escape_markdown(label)})" if label else f"`{address}`"
+
+
+# Добавляет строки списка, пока сообщение укладывается в MESSAGE_LIMIT с запасом reserve под хвост
+def append_limited(message, lines, limit=LIST_LIMIT, reserve=0):
+    shown = 0
+    for line in lines[:limit]:
+        if len(message) + len(line) + reserve + 32 > MESSAGE_LIMIT:
+            break
+        message += line
+        shown += 1
+    if shown < len(lines):
+        message += f"\n... и еще {len(lines) - shown}"
+    return message
+
+
+# ФОРМАТ УВЕДОМЛЕНИЯ
+def format_notification(wallet, amount, source, timestamp, tz, hop=None, token=None):
+    # Форматируем время в часовом поясе получателя
     dt = datetime.fromtimestamp(timestamp, tz=tz)
     time_str = dt.strftime("%Y-%m-%d %H:%M:%S %Z")
+    unit = escape_markdown(token_registry.symbol(token)) if token else "SOL"
 
-    # ФОРМАТ УВЕДОМЛЕНИЯ
     message = (
         f"🔥 New wallet detected!\n"
-        f"• Wallet: `{wallet}`\n"
-        f"• First deposit: {amount:.6f} SOL\n"
-        f"• From source: `{source}`\n"
+        f"• Wallet: {labelled(wallet)}\n"
+        f"• First deposit: {amount:.6f} {unit}\n"
+        f"• From source: {labelled(source)}\n"
         f"• Time: {time_str}"
     )
 
-    logger.info(f"📤 Отправка уведомления для кошелька {wallet}, сумма: {amount:.6f} SOL")
+    # Для кошельков, найденных трассировкой, показываем глубину и исходный источник
+    if hop:
+        depth, root = hop
+        message += f"\n• Hop: {depth} (root: {labelled(root)})"
+    if token:
+        message += f"\n• Token: `{token}`"
+    return message
 
+
+async def send_to_subscriber(context, subscriber, wallet, amount, source, timestamp, hop, signature, optimistic,
+                             token=None):
+    message = format_notification(wallet, amount, source, timestamp, subscriber.tz, hop, token)
+    status_line = "\n• Status: ⏳ confirmed, ожидает финализации" if optimistic else ""
     try:
-        # Проверка, что контекст и бот доступны
-        if context is None or context.bot is None:
-            logger.error("❌ Контекст или бот не инициализированы")
-            return False
-
-        await context.bot.send_message(
-            chat_id=ADMIN_USER_ID,
-            text=message,
-            parse_mode="Markdown"
-        )
-        logger.info(f"✅ Уведомление успешно отправлено в Telegram для кошелька {wallet}")
-        mark_wallet_notified(wallet)
-        return True
+        sent = await send_limited(context, subscriber.chat_id, text=message + status_line, parse_mode="Markdown")
     except Exception as e:
-        logger.error(f"❌ ОШИБКА отправки уведомления в Telegram: {e}")
-        logger.error(
-            f"Проверьте: 1) Правильность ADMIN_USER_ID ({ADMIN_USER_ID}), 2) Правильность BOT_TOKEN, 3) Заблокировал ли вас пользователь")
+        logger.error(f"❌ ОШИБКА отправки уведомления в чат {subscriber.chat_id}: {e}")
+        if subscriber.chat_id == ADMIN_USER_ID:
+            logger.error(
+                f"Проверьте: 1) Правильность ADMIN_USER_ID ({ADMIN_USER_ID}), 2) Правильность BOT_TOKEN, 3) Заблокировал ли вас пользователь")
         return False
 
+    if optimistic:
+        # Сохраняем в БД, чтобы сверка пережила перезапуск бота
+        add_pending_alert(signature, wallet, subscriber.chat_id, sent.message_id, message)
+    return True
+
+
+# Отправка уведомления всем подписчикам источника
+async def send_notification(context: ContextTypes.DEFAULT_TYPE, wallet, amount, source, timestamp, hop=None,
+                            signature=None, token=None):
+    # Цепочки трассировки получают подписчики исходного источника
+    route_source = hop[1] if hop else source
+    # Фильтры сумм подписчиков заданы в SOL; для токенов действует диапазон минта
+    subscribers = subscription_index.match(route_source, None if token else amount)
+    unit = token_registry.symbol(token) if token else "SOL"
+    if not subscribers:
+        logger.info(f"⏭️ Нет подписчиков с подходящим фильтром для {route_source}, сумма: {amount:.6f} {unit}")
+        return False
 
-# Анализ транзакции для поиска переводов SOL от нашего источника
-def analyze_transaction(tx_details, source_address, settings):
-    """
-    Анализирует транзакцию для поиска переводов SOL от указанного источника
-    Возвращает кортеж (найден_перевод, адрес_получателя, сумма_в_SOL, информация_для_лога)
-    """
-    try:
-        if not tx_details or 'transaction' not in tx_details or 'meta' not in tx_details:
-            logger.debug("❌ Транзакция не содержит необходимых данных")
-            return False, None, 0, "Некорректная структура транзакции"
-
-        transaction = tx_details['transaction']
-        meta = tx_details['meta']
-
-        if 'message' not in transaction:
-            logger.debug("❌ Транзакция не содержит секции message")
-            return False, None, 0, "Отсутствует секция message"
-
-        message = transaction['message']
-        account_keys = message.get('accountKeys', [])
+    # Проверка, что контекст и бот доступны
+    if context is None or context.bot is None:
+        logger.error("❌ Контекст или бот не инициализированы")
+        return False
 
-        if not account_keys:
-            logger.debug("❌ Транзакция не содержит accountKeys")
-            return False, None, 0, "Отсутствуют accountKeys"
+    settings = get_settings()
+    optimistic = bool(signature) and settings.get('optimistic_notify', 'false').lower() == 'true'
 
-        logger.debug(f"📋 Счета в транзакции: {account_keys}")
+    logger.info(f"📤 Отправка уведомления для кошелька {wallet}, сумма: {amount:.6f} {unit}, "
+                f"получателей: {len(subscribers)}")
 
-        # Находим индекс нашего адреса-источника
-        try:
-            source_index = account_keys.index(source_address)
-        except ValueError:
-            logger.debug(f"⏭️ Адрес источника {source_address} не найден в транзакции")
-            return False, None, 0, "Источник не найден в транзакции"
-
-        # Проверяем изменения баланса для нашего адреса
-        if 'preBalances' not in meta or 'postBalances' not in meta:
-            logger.debug("❌ Отсутствуют данные о балансах в meta")
-            return False, None, 0, "Отсутствуют данные о балансах"
-
-        pre_balance = meta['preBalances'][source_index]
-        post_balance = meta['postBalances'][source_index]
-        fee = meta.get('fee', 0)
-
-        # Изменение баланса = предыдущий баланс - текущий баланс - комиссия
-        balance_change = pre_balance - post_balance - fee
-
-        # Если баланс увеличился, это не исходящий перевод
-        if balance_change <= 0:
-            logger.debug(f"⏭️ Баланс адреса-источника не уменьшился (изменение: {balance_change})")
-            return False, None, 0, "Нет исходящего перевода с источника"
-
-        # Переводим lamports в SOL
-        amount_sol = balance_change / 1_000_000_000
-
-        # Проверяем фильтры суммы
-        min_amount = float(settings['min_amount'])
-        max_amount = float(settings['max_amount'])
-
-        if not (min_amount <= amount_sol <= max_amount):
-            logger.debug(f"⏭️ Сумма {amount_sol:.6f} SOL вне диапазона ({min_amount}-{max_amount})")
-            return False, None, 0, f"Сумма вне диапазона: {amount_sol:.6f} SOL"
-
-        # Теперь ищем получателя перевода
-        # Для этого анализируем инструкции на предмет перевода
-        instructions = message.get('instructions', [])
-        recipient = None
-
-        for instruction in instructions:
-            # Случай 1: Распарсенная инструкция
-            if 'parsed' in instruction and 'info' in instruction['parsed']:
-                parsed = instruction['parsed']
-                info = parsed['info']
-                instruction_type = parsed.get('type', '')
-
-                if instruction_type == 'transfer':
-                    if info.get('source') == source_address:
-                        recipient = info.get('destination')
-                        break
-
-            # Случай 2: Сырая инструкция для системного перевода
-            elif 'programIdIndex' in instruction:
-                program_id_index = instruction['programIdIndex']
-                if program_id_index < len(account_keys) and account_keys[
-                    program_id_index] == '11111111111111111111111111111111':
-                    # Это системная инструкция
-                    accounts = instruction.get('accounts', [])
-                    if len(accounts) >= 3:
-                        source_acc_index = accounts[0]  # Отправитель обычно первый
-                        dest_acc_index = accounts[1]  # Получатель обычно второй
-
-                        if source_acc_index < len(account_keys) and dest_acc_index < len(account_keys):
-                            if account_keys[source_acc_index] == source_address:
-                                recipient = account_keys[dest_acc_index]
-                                break
-
-        # Если не нашли получателя через инструкции, пробуем другой метод
-        if not recipient:
-            # Находим аккаунт, баланс которого увеличился примерно на сумму перевода
-            for i, (pre, post) in enumerate(zip(meta['preBalances'], meta['postBalances'])):
-                if i == source_index:
-                    continue
-
-                balance_diff = post - pre
-                # Учитываем погрешность из-за комиссий
-                if abs(balance_diff - balance_change) < 1000000:  # 0.001 SOL в lamports
-                    recipient = account_keys[i]
-                    break
-
-        if not recipient:
-            logger.debug("⏭️ Не удалось определить получателя перевода")
-            return False, None, 0, "Получатель не определен"
-
-        # Проверяем, не уведомляли ли уже об этом кошельке
-        if is_wallet_notified(recipient):
-            logger.debug(f"⏭️ Кошелек {recipient} уже был уведомлен ранее")
-            return False, None, 0, "Кошелек уже был уведомлен"
-
-        logger.info(f"✅ Обнаружен перевод: {source_address} -> {recipient}, сумма: {amount_sol:.6f} SOL")
-        return True, recipient, amount_sol, f"Перевод обнаружен: {amount_sol:.6f} SOL к {recipient}"
+    # Чаты отправляются параллельно, лимиты соблюдает rate_limiter
+    results = await asyncio.gather(*(
+        send_to_subscriber(context, subscriber, wallet, amount, source, timestamp, hop, signature, optimistic, token)
+        for subscriber in subscribers
+    ))
+    if not any(results):
+        return False
 
-    except Exception as e:
-        logger.error(f"❌ Ошибка анализа транзакции: {e}")
-        logger.exception("Полная ошибка:")
-        return False, None, 0, f"Ошибка анализа: {str(e)}"
+    logger.info(f"✅ Уведомление успешно отправлено в Telegram для кошелька {wallet}")
+    mark_wallet_notified(wallet)
+    return True
 
 
 # Проверка транзакций для всех адресов-источников
 async def check_transactions(context: ContextTypes.DEFAULT_TYPE):
-    logger.info("🔍 Начало проверки транзакций...")
-    sources = get_source_addresses()
-    if not sources:
-        logger.warning("📭 Нет адресов-источников для проверки. Добавьте адреса с помощью команды /addsource")
-        return
+    async def notify(wallet, amount, source, timestamp, hop=None, signature=None, token=None):
+        return await send_notification(context, wallet, amount, source, timestamp, hop=hop, signature=signature,
+                                       token=token)
 
-    settings = get_settings()
-    min_amount = float(settings['min_amount'])
-    max_amount = float(settings['max_amount'])
-    notify_all = settings.get('notify_all_transactions', 'true').lower() == 'true'
+    await run_check_pass(notify)
 
-    logger.info(f"⚙️ Настройки: min={min_amount}, max={max_amount}, notify_all={notify_all}")
-    logger.info(f"📦 Источников для проверки: {len(sources)}")
 
-    for source_address in sources:
-        logger.info(f"🔍 Проверка транзакций для адреса: {source_address}")
-        transactions = await get_outgoing_transactions(source_address)
+# Доставка уведомлений, найденных воркерами
+async def deliver_detections(context: ContextTypes.DEFAULT_TYPE):
+    rows = fetch_detections()
+    if not rows:
+        return
 
-        if not transactions:
-            logger.info(f"📭 Нет новых транзакций для адреса {source_address}")
+    delivered = []
+    # Воркеры и tracker.py --import-labels меняют токены и метки в обход бота
+    settings = get_settings()
+    token_registry.refresh(settings)
+    label_registry.refresh(settings)
+    for row_id, wallet, amount, source, timestamp, hop_depth, hop_root, signature, token in rows:
+        if is_wallet_notified(wallet):
+            delivered.append(row_id)
             continue
+        hop = (hop_depth, hop_root) if hop_depth else None
+        await send_notification(context, wallet, amount, source, timestamp, hop=hop, signature=signature,
+                                token=token)
+        delivered.append(row_id)
 
-        logger.info(f"📄 Найдено транзакций: {len(transactions)}")
+    delete_detections(delivered)
+    logger.info(f"📬 Доставлено уведомлений от воркеров: {len(delivered)}")
 
-        for tx in transactions:
-            signature = tx['signature']
-            slot_time = tx.get('blockTime', int(datetime.now().timestamp()))
 
-            # Пропускаем уже обработанные транзакции
-            if is_transaction_processed(signature):
-                logger.debug(f"⏭️ Транзакция {signature} уже обработана")
-                continue
+# Сверка быстрых уведомлений с финализацией транзакций
+async def reconcile_alerts(context: ContextTypes.DEFAULT_TYPE):
+    alerts = get_pending_alerts()
+    if not alerts:
+        return
 
-            # Получаем детали транзакции
-            tx_details = await get_transaction_details(signature)
-            if not tx_details:
-                logger.warning(f"⚠️ Не удалось получить детали транзакции {signature}")
-                mark_transaction_processed(signature)
-                continue
+    # Одна транзакция могла уйти в несколько чатов — запрашиваем статус один раз
+    signatures = list(dict.fromkeys(alert[0] for alert in alerts))
+    statuses = await get_signature_statuses(signatures)
+    if statuses is None:
+        return
+    status_by_signature = dict(zip(signatures, statuses))
+
+    now = int(datetime.now().timestamp())
+    for signature, wallet, chat_id, message_id, text, created_at in alerts:
+        status = status_by_signature.get(signature)
+        if status and status.get('err') is not None:
+            verdict, dropped = "❌ транзакция завершилась ошибкой", True
+        elif status and status.get('confirmationStatus') == 'finalized':
+            verdict, dropped = "✅ finalized", False
+        elif status is None and now - created_at > ALERT_DROP_TIMEOUT:
+            verdict, dropped = "❌ транзакция выброшена из сети", True
+        else:
+            continue
 
-            # Анализируем транзакцию
-            found_transfer, recipient, amount_sol, log_info = analyze_transaction(
-                tx_details, source_address, settings
+        if dropped:
+            # Кошелек снова может получить "первое пополнение"
+            unmark_wallet_notified(wallet)
+
+        try:
+            await rate_limiter.wait(chat_id)
+            await context.bot.edit_message_text(
+                chat_id=chat_id,
+                message_id=message_id,
+                text=f"{text}\n• Status: {verdict}",
+                parse_mode="Markdown"
             )
+        except Exception as e:
+            logger.error(f"❌ Не удалось обновить уведомление для {wallet}: {e}")
+            if dropped:
+                try:
+                    await send_limited(
+                        context,
+                        chat_id,
+                        text=f"⚠️ Уведомление отменено: {verdict}\n• Wallet: `{wallet}`",
+                        parse_mode="Markdown"
+                    )
+                except Exception as e:
+                    # Чат заблокировал бота и т.п. — запись все равно удаляем,
+                    # иначе она навсегда останется в начале очереди сверки
+                    logger.error(f"❌ Не удалось отправить отмену уведомления в чат {chat_id}: {e}")
+
+        delete_pending_alert(signature, chat_id)
+        logger.info(f"🔁 Сверка уведомления для {wallet}: {verdict}")
 
-            if found_transfer:
-                # Отправляем уведомление
-                success = await send_notification(
-                    context,
-                    recipient,
-                    amount_sol,
-                    source_address,
-                    slot_time
-                )
-
-                if success:
-                    logger.info(f"✅ Уведомление успешно отправлено для кошелька {recipient}")
-                else:
-                    logger.error(f"❌ Не удалось отправить уведомление для кошелька {recipient}")
-            else:
-                logger.info(f"⏭️ {log_info}")
-
-            # Помечаем транзакцию как обработанную в любом случае
-            mark_transaction_processed(signature)
-            logger.info(f"✅ Транзакция {signature} обработана и помечена как processed")
-
-    logger.info("✅ Проверка транзакций завершена")
-
-
-async def get_wallet_balance(address):
-    payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "getBalance",
-        "params": [address]
-    }
 
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(SOLANA_RPC_URL, json=payload, timeout=10) as response:
-                if response.status != 200:
-                    logger.error(f"Ошибка получения баланса: HTTP {response.status}")
-                    return None
-                result = await response.json()
-                return result.get('result', {}).get('value', 0)
-    except Exception as e:
-        logger.error(f"Ошибка получения баланса для {address}: {e}")
-        return None
+# Команды бота
+SUBSCRIBER_HELP = (
+    "Подписки этого чата:\n"
+    "/subscribe <адрес> - Получать уведомления по адресу-источнику\n"
+    "/unsubscribe <адрес> - Отписаться от адреса\n"
+    "/mysubs - Подписки и фильтры чата\n"
+    "/myrange <мин> <макс> - Диапазон сумм для чата (SOL)\n"
+    "/mytimezone <смещение> - Часовой пояс для чата (UTC+offset)"
+)
 
 
-# Команды бота
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != ADMIN_USER_ID:
-        await update.message.reply_text("❌ У вас нет доступа к этому боту")
+        await update.message.reply_text(SUBSCRIBER_HELP)
         return
 
     help_text = (
@@ -521,11 +312,18 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/addsource - Добавить адрес-источник\n"
         "/deletesource - Удалить адрес-источник\n"
         "/listsources - Показать список адресов\n"
+        "/importsources - Импорт адресов с метками из CSV/JSON\n"
         "/setrange - Установить диапазон сумм (SOL)\n"
         "/settimezone - Установить часовой пояс (UTC+offset)\n"
         "/setnotifications - Настроить режим уведомлений\n"
+        "/setfast - Быстрые уведомления до финализации (вкл/выкл)\n"
         "/clearcache - Очистить кэш обработанных транзакций\n"
-        "/settings - Показать текущие настройки"
+        "/settrace - Настроить трассировку средств (глубина, TTL)\n"
+        "/trace <адрес> - Показать цепочку переводов к кошельку\n"
+        "/settoken - Отслеживаемые SPL-токены и их диапазоны сумм\n"
+        "/profile <N> - Профилировать следующие N проходов проверки\n"
+        "/settings - Показать текущие настройки\n\n"
+        + SUBSCRIBER_HELP
     )
     await update.message.reply_text(help_text)
 
@@ -550,6 +348,7 @@ async def add_source_process(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return ADD_SOURCE
 
     if add_source_address(address):
+        subscription_index.reload()
         await update.message.reply_text(
             f"✅ Адрес успешно добавлен:\n`{address}`",
             parse_mode="Markdown"
@@ -572,8 +371,10 @@ async def delete_source_start(update: Update, context: ContextTypes.DEFAULT_TYPE
         return ConversationHandler.END
 
     message = "Выберите адрес для удаления:\n\n"
-    for i, addr in enumerate(sources, 1):
-        message += f"{i}. `{addr}`\n"
+    for i, addr in enumerate(sources[:LIST_LIMIT], 1):
+        message += f"{i}. {labelled(addr)}\n"
+    if len(sources) > LIST_LIMIT:
+        message += f"... и еще {len(sources) - LIST_LIMIT} (их можно удалить, введя адрес)\n"
 
     await update.message.reply_text(
         message + "\nВведите номер адреса или сам адрес:",
@@ -604,6 +405,7 @@ async def delete_source_process(update: Update, context: ContextTypes.DEFAULT_TY
         return DELETE_SOURCE
 
     if delete_source_address(address):
+        subscription_index.reload()
         await update.message.reply_text(
             f"✅ Адрес успешно удален:\n`{address}`",
             parse_mode="Markdown"
@@ -625,13 +427,48 @@ async def list_sources(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("📭 Список источников пуст")
         return
 
-    message = "📋 Список адресов-источников:\n\n"
-    for i, addr in enumerate(sources, 1):
-        message += f"{i}. `{addr}`\n"
+    message = f"📋 Список адресов-источников ({len(sources)}):\n\n"
+    for i, addr in enumerate(sources[:LIST_LIMIT], 1):
+        message += f"{i}. {labelled(addr)}\n"
+    if len(sources) > LIST_LIMIT:
+        message += f"... и еще {len(sources) - LIST_LIMIT}\n"
 
     await update.message.reply_text(message, parse_mode="Markdown")
 
 
+async def import_sources_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_USER_ID:
+        return
+
+    await update.message.reply_text(
+        "Отправьте файл CSV (колонки address,name) или JSON ([{\"address\", \"name\"}] или {адрес: метка}).\n"
+        "Адреса будут добавлены в источники, метки — в реестр бирж."
+    )
+    return IMPORT_SOURCES
+
+
+async def import_sources_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    document = update.message.document
+    try:
+        file = await document.get_file()
+        text = (await file.download_as_bytearray()).decode('utf-8-sig')
+        entries = parse_labels(text, document.file_name or '')
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Не удалось разобрать файл: {e}\nОтправьте другой файл или /cancel")
+        return IMPORT_SOURCES
+
+    imported, invalid = import_labels(entries)
+    subscription_index.reload()
+
+    message = f"✅ Импортировано адресов: {imported}"
+    if invalid:
+        message += f"\n⚠️ Пропущено некорректных: {len(invalid)}"
+        for address in invalid[:10]:
+            message += f"\n• {address!r}"
+    await update.message.reply_text(message)
+    return ConversationHandler.END
+
+
 async def set_range_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != ADMIN_USER_ID:
         return
@@ -672,6 +509,7 @@ async def set_range_max(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         update_setting('min_amount', str(min_amount))
         update_setting('max_amount', str(max_amount))
+        subscription_index.reload()
 
         await update.message.reply_text(
             f"✅ Диапазон успешно установлен:\n"
@@ -703,6 +541,7 @@ async def set_timezone_process(update: Update, context: ContextTypes.DEFAULT_TYP
             raise ValueError
 
         update_setting('timezone', str(tz_offset))
+        subscription_index.reload()
         await update.message.reply_text(
             f"✅ Часовой пояс установлен: UTC{tz_offset:+d}"
         )
@@ -732,6 +571,22 @@ async def set_notification_mode(update: Update, context: ContextTypes.DEFAULT_TY
     return ConversationHandler.END
 
 
+async def set_fast_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_USER_ID:
+        return
+
+    settings = get_settings()
+    new_mode = not settings.get('optimistic_notify', 'false').lower() == 'true'
+    update_setting('optimistic_notify', str(new_mode).lower())
+
+    if new_mode:
+        text = ("✅ Быстрые уведомления включены:\n"
+                "уведомление приходит на уровне confirmed и обновляется после финализации")
+    else:
+        text = "✅ Быстрые уведомления выключены: отслеживаются только финализированные транзакции"
+    await update.message.reply_text(text)
+
+
 async def clear_cache(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != ADMIN_USER_ID:
         return
@@ -740,30 +595,311 @@ async def clear_cache(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("✅ Кэш обработанных транзакций и уведомленных кошельков очищен")
 
 
+async def set_trace(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_USER_ID:
+        return
+
+    args = context.args or []
+    if args and args[0].lower() == 'off':
+        update_setting('trace_enabled', 'false')
+        await update.message.reply_text("✅ Трассировка средств выключена")
+        return
+
+    try:
+        settings = get_settings()
+        depth = int(args[0]) if len(args) > 0 else int(settings.get('trace_depth', '2'))
+        ttl_minutes = int(args[1]) if len(args) > 1 else int(settings.get('trace_ttl', '3600')) // 60
+        max_nodes = int(args[2]) if len(args) > 2 else int(settings.get('trace_max_nodes', '50'))
+        if depth < 1 or ttl_minutes < 1 or max_nodes < 1:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text(
+            "❌ Использование: /settrace <глубина> <TTL в минутах> [макс. узлов] или /settrace off"
+        )
+        return
+
+    update_setting('trace_enabled', 'true')
+    update_setting('trace_depth', str(depth))
+    update_setting('trace_ttl', str(ttl_minutes * 60))
+    update_setting('trace_max_nodes', str(max_nodes))
+
+    # Новый лимит действует сразу, а не со следующего добавления узла
+    transfer_graph.refresh()
+    transfer_graph.trim(max_nodes)
+
+    await update.message.reply_text(
+        f"✅ Трассировка средств включена:\n"
+        f"Глубина: {depth}\n"
+        f"TTL узла: {ttl_minutes} мин\n"
+        f"Максимум узлов: {max_nodes}"
+    )
+
+
+async def set_token(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_USER_ID:
+        return
+
+    args = context.args or []
+    token_registry.reload()
+
+    if not args:
+        if not token_registry.tokens:
+            await update.message.reply_text(
+                "📭 SPL-токены не отслеживаются\n"
+                "Добавить: /settoken <минт> <мин> <макс> [символ]"
+            )
+            return
+        message = "🪙 Отслеживаемые SPL-токены:"
+        for mint, info in token_registry.tokens.items():
+            decimals = info.decimals if info.decimals is not None else "?"
+            message += (f"\n• {escape_markdown(token_registry.symbol(mint))} `{mint}`: "
+                        f"{info.min_amount:g} - {info.max_amount:g} (decimals: {decimals})")
+        await update.message.reply_text(message, parse_mode="Markdown")
+        return
+
+    mint = args[0]
+    if not is_valid_solana_address(mint):
+        await update.message.reply_text("❌ Неверный адрес минта Solana")
+        return
+
+    if len(args) == 2 and args[1].lower() == 'off':
+        if delete_token(mint):
+            token_registry.reload()
+            await update.message.reply_text(f"✅ Токен {mint} больше не отслеживается")
+        else:
+            await update.message.reply_text("❌ Токен не найден в списке")
+        return
+
+    try:
+        if len(args) not in (3, 4):
+            raise ValueError
+        min_amount = float(args[1])
+        max_amount = float(args[2])
+        if min_amount < 0 or max_amount <= min_amount:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text(
+            "❌ Использование: /settoken <минт> <мин> <макс> [символ] или /settoken <минт> off"
+        )
+        return
+
+    set_token_range(mint, min_amount, max_amount, args[3] if len(args) == 4 else None)
+    token_registry.reload()
+    token_registry.unresolved.discard(mint)
+    # Метаданные минта запрашиваются один раз здесь, а не при разборе транзакций
+    await refresh_token_metadata()
+
+    info = token_registry.tokens[mint]
+    message = (f"✅ Отслеживается токен {token_registry.symbol(mint)}:\n"
+               f"Диапазон: {min_amount:g} - {max_amount:g}")
+    if info.decimals is None:
+        message += "\n⚠️ Метаданные минта не получены: decimals будут взяты из транзакций"
+    else:
+        message += f"\nDecimals: {info.decimals}"
+    await update.message.reply_text(message)
+
+
+async def trace_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_USER_ID:
+        return
+
+    if not context.args or not is_valid_solana_address(context.args[0]):
+        await update.message.reply_text("❌ Использование: /trace <адрес Solana>")
+        return
+
+    wallet = context.args[0]
+    transfer_graph.refresh()
+    paths = transfer_graph.find_paths(wallet)
+    recipients = transfer_graph.edges.get(wallet, {})
+
+    if not paths and not recipients:
+        await update.message.reply_text("📭 Кошелек не найден в графе переводов")
+        return
+
+    node = transfer_graph.nodes.get(wallet)
+    footer = f"\n\n👁️ Отслеживается: глубина {node['depth']}, корень `{node['root']}`" if node else ""
+
+    # У горячего кошелька биржи могут быть тысячи получателей: показываем крупнейшие
+    # и следим за общей длиной, оставляя место под заголовок получателей и подвал
+    message = f"🕸️ Трассировка `{wallet}`\n"
+    if paths:
+        message += "\n⬆️ Цепочки поступлений:"
+        lines = [f"\n{i}. " + " → ".join(labelled(addr) for addr in path) for i, path in enumerate(paths, 1)]
+        message = append_limited(message, lines, reserve=len(footer) + (200 if recipients else 0))
+    if recipients:
+        message += "\n\n⬇️ Переводы получателям:"
+        lines = [
+            f"\n• {labelled(addr)}: {amount:.6f} SOL"
+            for addr, amount in sorted(recipients.items(), key=lambda item: item[1], reverse=True)
+        ]
+        message = append_limited(message, lines, reserve=len(footer))
+    message += footer
+
+    await update.message.reply_text(message, parse_mode="Markdown")
+
+
+async def profile_passes(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_USER_ID:
+        return
+
+    if context.bot_data.get('notifier'):
+        await update.message.reply_text(
+            "❌ В режиме --notifier проходы выполняют воркеры: запустите воркер с --profile N"
+        )
+        return
+
+    if pass_profiler.active:
+        await update.message.reply_text(f"⏳ Профилирование уже идет, осталось проходов: {pass_profiler.remaining}")
+        return
+
+    try:
+        passes = int(context.args[0]) if context.args else 1
+        if not 1 <= passes <= 100:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text("❌ Использование: /profile <число проходов от 1 до 100>")
+        return
+
+    chat_id = update.effective_chat.id
+
+    async def on_done(report, path):
+        # Без Markdown: имена функций содержат подчеркивания
+        text = f"{report}\n\n💾 Полный профиль: {path}"
+        await context.bot.send_message(chat_id=chat_id, text=text[:4000])
+
+    pass_profiler.start(passes, on_done)
+    await update.message.reply_text(
+        f"⏱️ Профилирование следующих {passes} проходов проверки (интервал {CHECK_INTERVAL} с)"
+    )
+
+
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not context.args or not is_valid_solana_address(context.args[0]):
+        await update.message.reply_text("❌ Использование: /subscribe <адрес Solana>")
+        return
+
+    address = context.args[0]
+    try:
+        subscribed = subscribe_chat(update.effective_chat.id, address)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Не удалось подписаться. {e}")
+        return
+    if not subscribed:
+        await update.message.reply_text("❌ Не удалось подписаться. Попробуйте позже.")
+        return
+
+    subscription_index.reload()
+    await update.message.reply_text(f"✅ Чат подписан на адрес:\n`{address}`", parse_mode="Markdown")
+
+
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not context.args or not is_valid_solana_address(context.args[0]):
+        await update.message.reply_text("❌ Использование: /unsubscribe <адрес Solana>")
+        return
+
+    address = context.args[0]
+    if unsubscribe_chat(update.effective_chat.id, address):
+        subscription_index.reload()
+        await update.message.reply_text(f"✅ Подписка удалена:\n`{address}`", parse_mode="Markdown")
+    else:
+        await update.message.reply_text("❌ Чат не подписан на этот адрес.")
+
+
+async def my_subscriptions(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    addresses, filters_row = get_chat_subscriptions(update.effective_chat.id)
+    if not addresses:
+        await update.message.reply_text("📭 У чата нет подписок. Добавьте адрес: /subscribe <адрес>")
+        return
+
+    min_amount, max_amount, tz_offset = filters_row
+    message = (
+        f"💰 Диапазон сумм: {min_amount:.6f} - {max_amount:.4f} SOL\n"
+        f"🕒 Часовой пояс: UTC{tz_offset:+d}\n\n"
+        f"📋 Подписки чата ({len(addresses)}/{MAX_SUBSCRIPTIONS_PER_CHAT}):"
+    )
+    for i, addr in enumerate(addresses[:LIST_LIMIT], 1):
+        message += f"\n{i}. `{addr}`"
+    if len(addresses) > LIST_LIMIT:
+        message += f"\n... и еще {len(addresses) - LIST_LIMIT}"
+    await update.message.reply_text(message, parse_mode="Markdown")
+
+
+async def my_range(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        min_amount, max_amount = (float(arg) for arg in context.args)
+        if min_amount < 0 or max_amount < min_amount:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text("❌ Использование: /myrange <мин> <макс>, например /myrange 1.5 15")
+        return
+
+    if not update_subscriber(update.effective_chat.id, min_amount=min_amount, max_amount=max_amount):
+        await update.message.reply_text("📭 Сначала подпишитесь на адрес: /subscribe <адрес>")
+        return
+
+    subscription_index.reload()
+    await update.message.reply_text(
+        f"✅ Диапазон чата установлен:\n"
+        f"Минимум: {min_amount} SOL\n"
+        f"Максимум: {max_amount} SOL"
+    )
+
+
+async def my_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        tz_offset = int(context.args[0]) if context.args else None
+        if tz_offset is None or not -12 <= tz_offset <= 14:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text("❌ Использование: /mytimezone <целое число от -12 до 14>")
+        return
+
+    if not update_subscriber(update.effective_chat.id, timezone=tz_offset):
+        await update.message.reply_text("📭 Сначала подпишитесь на адрес: /subscribe <адрес>")
+        return
+
+    subscription_index.reload()
+    await update.message.reply_text(f"✅ Часовой пояс чата установлен: UTC{tz_offset:+d}")
+
+
 async def show_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != ADMIN_USER_ID:
         return
 
     settings = get_settings()
     sources = get_source_addresses()
+    token_registry.refresh(settings)
 
     tz_offset = int(settings['timezone'])
     notify_all = settings.get('notify_all_transactions', 'true').lower() == 'true'
     notify_mode = "Все транзакции" if notify_all else "Только первые транзакции"
+    optimistic = settings.get('optimistic_notify', 'false').lower() == 'true'
+    fast_mode = "включены (confirmed + сверка)" if optimistic else "выключены (finalized)"
+    tracing = settings.get('trace_enabled', 'false').lower() == 'true'
+    trace_mode = (
+        f"глубина {settings['trace_depth']}, TTL {int(settings['trace_ttl']) // 60} мин, "
+        f"узлов {len(transfer_graph.nodes)}/{settings['trace_max_nodes']}"
+        if tracing else "выключена"
+    )
 
     message = (
         "⚙️ Текущие настройки:\n\n"
         f"🕒 Часовой пояс: UTC{tz_offset:+d}\n"
         f"💰 Диапазон сумм: {float(settings['min_amount']):.6f} - {float(settings['max_amount']):.4f} SOL\n"
         f"🔔 Режим уведомлений: {notify_mode}\n"
+        f"⚡ Быстрые уведомления: {fast_mode}\n"
+        f"🕸️ Трассировка: {trace_mode}\n"
+        f"🪙 SPL-токенов: {len(token_registry.tokens)} (/settoken)\n"
         f"📦 Адресов-источников: {len(sources)}\n\n"
         f"👤 ADMIN_USER_ID: {ADMIN_USER_ID}"
     )
 
     if sources:
         message += "\n\n📋 Список адресов-источников:"
-        for i, addr in enumerate(sources, 1):
-            message += f"\n{i}. `{addr}`"
+        for i, addr in enumerate(sources[:LIST_LIMIT], 1):
+            message += f"\n{i}. {labelled(addr)}"
+        if len(sources) > LIST_LIMIT:
+            message += f"\n... и еще {len(sources) - LIST_LIMIT}"
 
     await update.message.reply_text(message, parse_mode="Markdown")
 
@@ -787,26 +923,65 @@ async def post_init(application: Application) -> None:
         logger.error(f"❌ Ошибка подключения к Telegram API: {e}")
         logger.error("Проверьте правильность токена бота!")
 
-    # Запуск фоновой задачи проверки транзакций
+    if application.bot_data.get('notifier'):
+        # Источники опрашивают воркеры, бот только доставляет уведомления
+        application.job_queue.run_repeating(
+            deliver_detections,
+            interval=2,
+            first=1
+        )
+        logger.info("📬 Режим отправителя уведомлений: опрос источников выполняют воркеры")
+    else:
+        # Запуск фоновой задачи проверки транзакций
+        application.job_queue.run_repeating(
+            check_transactions,
+            interval=CHECK_INTERVAL,  # Проверять каждые 15 секунд
+            first=1
+        )
+
+    # Сверка быстрых уведомлений с финализацией (пустой проход, если режим выключен)
     application.job_queue.run_repeating(
-        check_transactions,
-        interval=15,  # Проверять каждые 15 секунд
-        first=1
+        reconcile_alerts,
+        interval=5,
+        first=5
     )
     logger.info("✅ JobQueue успешно запущен")
-    logger.info(f"🚀 Бот запущен и работает с RPC: {SOLANA_RPC_URL}")
+    logger.info(f"🚀 Бот запущен и работает с RPC: {tracker.SOLANA_RPC_URL}")
     logger.info(f"👤 ADMIN_USER_ID: {ADMIN_USER_ID}")
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Solana Wallet Tracker Bot")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--worker", action="store_true",
+                      help="опрашивать свой шард источников без Telegram и складывать находки в БД")
+    mode.add_argument("--notifier", action="store_true",
+                      help="запустить Telegram-бота без опроса: только доставка находок воркеров")
+    tracker.add_common_args(parser)
+    return parser.parse_args(argv)
+
+
 def main():
-    # Инициализация базы данных
-    init_db()
+    args = parse_args()
+    tracker.configure(args)
 
-    # Очистка кэша при запуске для тестирования
-    clear_test_data()
+    # Адреса из sources принадлежат администратору
+    subscription_index.admin_chat_id = ADMIN_USER_ID
+    subscription_index.reload()
+
+    if args.worker:
+        # Воркеру Telegram не нужен; без загрузки бота: python tracker.py --worker
+        tracker.run_until_stopped(run_worker(args.worker_id))
+        return
+
+    # Очистка кэша при запуске для тестирования (только в одиночном режиме:
+    # воркеры делят processed_txs и могут работать дольше бота)
+    if not args.notifier:
+        clear_test_data()
 
     # Создание приложения с ВАШИМ реальным токеном
     application = Application.builder().token(BOT_TOKEN).post_init(post_init).build()
+    application.bot_data['notifier'] = args.notifier
 
     # ConversationHandler для добавления адреса
     conv_add_source = ConversationHandler(
@@ -854,16 +1029,36 @@ def main():
         fallbacks=[CommandHandler('cancel', cancel)]
     )
 
+    # ConversationHandler для импорта адресов с метками из файла
+    conv_import_sources = ConversationHandler(
+        entry_points=[CommandHandler('importsources', import_sources_start)],
+        states={
+            IMPORT_SOURCES: [MessageHandler(filters.Document.ALL, import_sources_process)]
+        },
+        fallbacks=[CommandHandler('cancel', cancel)]
+    )
+
     # Регистрация обработчиков
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("listsources", list_sources))
     application.add_handler(CommandHandler("settings", show_settings))
     application.add_handler(CommandHandler("clearcache", clear_cache))
+    application.add_handler(CommandHandler("setfast", set_fast_mode))
+    application.add_handler(CommandHandler("settrace", set_trace))
+    application.add_handler(CommandHandler("trace", trace_wallet))
+    application.add_handler(CommandHandler("settoken", set_token))
+    application.add_handler(CommandHandler("profile", profile_passes))
+    application.add_handler(CommandHandler("subscribe", subscribe))
+    application.add_handler(CommandHandler("unsubscribe", unsubscribe))
+    application.add_handler(CommandHandler("mysubs", my_subscriptions))
+    application.add_handler(CommandHandler("myrange", my_range))
+    application.add_handler(CommandHandler("mytimezone", my_timezone))
     application.add_handler(conv_add_source)
     application.add_handler(conv_delete_source)
     application.add_handler(conv_set_range)
     application.add_handler(conv_set_timezone)
     application.add_handler(conv_set_notification)
+    application.add_handler(conv_import_sources)
 
     # Запуск бота
     logger.info("🚀 Бот запускается...")
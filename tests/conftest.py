@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tracker  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Каждый тест работает со своей временной базой
+    path = str(tmp_path / "tracker.db")
+    monkeypatch.setattr(tracker, "DB_PATH", path)
+    tracker.init_db()
+    return path
@@ -0,0 +1,103 @@
+"""
+Заглушка Solana RPC для локальной проверки воркеров и headless-режима.
+
+Каждый адрес делает один исходящий перевод 1 SOL получателю stub_recipient(адрес).
+GET /stats возвращает число вызовов по методам и опросы getSignaturesForAddress по адресам.
+
+    python tests/stub_rpc.py --port 18899
+"""
+import os
+import sys
+import hashlib
+import argparse
+from collections import Counter
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracker import b58encode  # noqa: E402
+
+SYSTEM_PROGRAM = '11111111111111111111111111111111'
+LAMPORTS = 1_000_000_000
+FEE = 5000
+BLOCK_TIME = 1700000000
+
+
+def stub_recipient(address):
+    return b58encode(hashlib.sha256(address.encode()).digest())
+
+
+def stub_signature(address):
+    return b58encode(hashlib.sha512(address.encode()).digest())
+
+
+def stub_transaction(address):
+    return {
+        "blockTime": BLOCK_TIME,
+        "transaction": {
+            "message": {
+                "accountKeys": [address, stub_recipient(address), SYSTEM_PROGRAM],
+                "instructions": [{"programIdIndex": 2, "accounts": [0, 1], "data": ""}]
+            }
+        },
+        "meta": {
+            "err": None,
+            "fee": FEE,
+            "preBalances": [10 * LAMPORTS, 0, 1],
+            "postBalances": [9 * LAMPORTS - FEE, LAMPORTS, 1]
+        }
+    }
+
+
+def make_app():
+    calls = Counter()
+    polled = Counter()
+    by_signature = {}
+
+    async def rpc(request):
+        body = await request.json()
+        method, params = body['method'], body.get('params', [])
+        calls[method] += 1
+
+        if method == 'getSignaturesForAddress':
+            address = params[0]
+            polled[address] += 1
+            signature = stub_signature(address)
+            by_signature[signature] = address
+            result = [{"signature": signature, "blockTime": BLOCK_TIME, "err": None}]
+        elif method == 'getTransaction':
+            address = by_signature.get(params[0])
+            result = stub_transaction(address) if address else None
+        elif method == 'getSignatureStatuses':
+            result = {"value": [
+                {"confirmationStatus": "finalized", "err": None} if sig in by_signature else None
+                for sig in params[0]
+            ]}
+        elif method == 'getMultipleAccounts':
+            result = {"value": [None for _ in params[0]]}
+        elif method == 'getBalance':
+            result = {"value": 10 * LAMPORTS}
+        else:
+            return web.json_response({"jsonrpc": "2.0", "id": body.get('id'),
+                                      "error": {"code": -32601, "message": "Method not found"}})
+        return web.json_response({"jsonrpc": "2.0", "id": body.get('id'), "result": result})
+
+    async def stats(request):
+        return web.json_response({"calls": calls, "polled": polled})
+
+    app = web.Application()
+    app.router.add_post('/', rpc)
+    app.router.add_get('/stats', stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Solana RPC")
+    parser.add_argument("--port", type=int, default=18899)
+    args = parser.parse_args()
+    web.run_app(make_app(), host='127.0.0.1', port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
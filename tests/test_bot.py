@@ -0,0 +1,117 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+from telegram.error import BadRequest, Forbidden
+
+import bot
+import tracker
+from tracker import b58encode
+
+
+class FakeBot:
+    def __init__(self, blocked):
+        self.blocked = blocked
+        self.sent = []
+        self.texts = []
+
+    async def edit_message_text(self, chat_id, message_id, text, parse_mode=None):
+        raise BadRequest("Message to edit not found")
+
+    async def send_message(self, chat_id, **kwargs):
+        if chat_id in self.blocked:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        self.sent.append(chat_id)
+        self.texts.append(kwargs['text'])
+        return SimpleNamespace(message_id=len(self.sent))
+
+
+def test_reconcile_drops_alert_for_blocked_chat(db, monkeypatch):
+    signature = b58encode(b'\x01' * 64)
+    wallet = b58encode(b'\x02' * 32)
+    # Первой в очереди идет запись чата, заблокировавшего бота
+    tracker.add_pending_alert(signature, wallet, 111, 1, "alert")
+    tracker.add_pending_alert(signature, wallet, 222, 2, "alert")
+
+    async def statuses(signatures):
+        return [{"confirmationStatus": "finalized", "err": "InstructionError"} for _ in signatures]
+
+    monkeypatch.setattr(bot, 'get_signature_statuses', statuses)
+    fake = FakeBot(blocked={111})
+    asyncio.run(bot.reconcile_alerts(SimpleNamespace(bot=fake)))
+
+    assert fake.sent == [222]
+    assert tracker.get_pending_alerts() == []
+
+
+def test_deliver_detections_sees_labels_imported_elsewhere(db, monkeypatch):
+    source = b58encode(b'\x03' * 32)
+    wallet = b58encode(b'\x04' * 32)
+    tracker.add_source_address(source)
+    monkeypatch.setattr(tracker.subscription_index, 'admin_chat_id', 333)
+    tracker.subscription_index.reload()
+    tracker.label_registry.reload()
+
+    # Метки импортировал другой процесс (tracker.py --import-labels)
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO exchanges (name, address) VALUES (?, ?)", ("Binance", source))
+    conn.execute("UPDATE settings SET value = CAST(value AS INTEGER) + 1 WHERE key = 'labels_version'")
+    conn.commit()
+    conn.close()
+
+    tracker.enqueue_detection(wallet, 1.0, source, 1700000000, None, 'w1')
+    fake = FakeBot(blocked=set())
+    asyncio.run(bot.deliver_detections(SimpleNamespace(bot=fake)))
+
+    assert fake.sent == [333]
+    assert f"`{source}` (Binance)" in fake.texts[0]
+    assert tracker.fetch_detections() == []
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, parse_mode=None):
+        self.replies.append(text)
+
+
+def _update(chat_id, user_id=1):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), effective_user=SimpleNamespace(id=user_id),
+                           message=FakeMessage())
+
+
+def test_my_subscriptions_fits_telegram_limit(db):
+    for i in range(tracker.MAX_SUBSCRIPTIONS_PER_CHAT):
+        assert tracker.subscribe_chat(444, b58encode(bytes([i + 1]) * 32))
+
+    update = _update(444)
+    asyncio.run(bot.my_subscriptions(update, SimpleNamespace(args=[])))
+
+    reply = update.message.replies[0]
+    assert len(reply) < 4096
+    assert f"... и еще {tracker.MAX_SUBSCRIPTIONS_PER_CHAT - bot.LIST_LIMIT}" in reply
+
+
+def test_trace_of_busy_source_fits_telegram_limit(db, monkeypatch):
+    source = b58encode(b'\x05' * 32)
+    graph = tracker.transfer_graph
+    graph.load()
+    # Пять длинных цепочек к источнику и сотни получателей от него
+    for chain in range(5):
+        hops = [b58encode(bytes([chain + 10, hop]) * 16) for hop in range(10)] + [source]
+        for sender, recipient in zip(hops, hops[1:]):
+            graph.add_edge(sender, recipient, 1.0, f'sig{chain}', 0)
+    for i in range(300):
+        graph.add_edge(source, b58encode(i.to_bytes(2, 'big') * 16), 0.001 * (i + 1), f'out{i}', 0)
+    monkeypatch.setattr(tracker.label_registry, 'labels', {address: 'Биржевой кошелек_' * 2 for address in graph.incoming})
+
+    update = _update(555, user_id=bot.ADMIN_USER_ID)
+    asyncio.run(bot.trace_wallet(update, SimpleNamespace(args=[source])))
+
+    reply = update.message.replies[0]
+    assert len(reply) <= bot.MESSAGE_LIMIT
+    assert "⬇️ Переводы получателям:" in reply
+    # Крупнейшие получатели идут первыми, остаток посчитан
+    assert f"{b58encode((299).to_bytes(2, 'big') * 16)}" in reply
+    assert "... и еще" in reply
@@ -0,0 +1,69 @@
+import os
+import json
+import signal
+import asyncio
+
+import pytest
+
+import tracker
+from tracker import b58encode
+from stub_rpc import stub_transaction, stub_recipient
+
+SETTINGS = {'min_amount': '0.001', 'max_amount': '10'}
+
+
+@pytest.fixture
+def pool():
+    tracker.start_decode_pool(1)
+    try:
+        yield
+    finally:
+        tracker.decode_pool.shutdown(cancel_futures=True)
+        tracker.decode_pool = None
+
+
+def test_pool_restarts_after_child_crash(pool):
+    source = b58encode(bytes([7]) * 32)
+    raw = [json.dumps({'result': stub_transaction(source)}).encode()]
+
+    assert asyncio.run(tracker.decode_transactions(raw, source, SETTINGS))[0][1] == stub_recipient(source)
+
+    broken = tracker.decode_pool
+    for pid in list(broken._processes):
+        os.kill(pid, signal.SIGKILL)
+
+    # Пачка разбирается в цикле событий, пул заменяется новым
+    records = asyncio.run(tracker.decode_transactions(raw, source, SETTINGS))
+    assert records[0][:3] == (True, stub_recipient(source), 1.0)
+    assert tracker.decode_pool is not broken
+    assert asyncio.run(tracker.decode_transactions(raw, source, SETTINGS)) == records
+
+
+def test_sources_are_decoded_concurrently(db, monkeypatch):
+    for i in range(1, 5):
+        tracker.add_source_address(b58encode(bytes([i]) * 32))
+
+    in_flight = {'now': 0, 'max': 0}
+
+    async def fake_signatures(address, before=None, commitment=None):
+        return [{'signature': b58encode(tracker.b58decode(address) * 2), 'blockTime': 0}]
+
+    async def fake_raw(signature):
+        return b'{}'
+
+    async def fake_decode(raw_responses, source_address, settings):
+        in_flight['now'] += 1
+        in_flight['max'] = max(in_flight['max'], in_flight['now'])
+        await asyncio.sleep(0.05)
+        in_flight['now'] -= 1
+        return [None] * len(raw_responses)
+
+    async def notify(*args, **kwargs):
+        return True
+
+    monkeypatch.setattr(tracker, 'get_outgoing_transactions', fake_signatures)
+    monkeypatch.setattr(tracker, 'get_transaction_raw', fake_raw)
+    monkeypatch.setattr(tracker, 'decode_transactions', fake_decode)
+    asyncio.run(tracker.run_check_pass(notify))
+
+    assert in_flight['max'] > 1
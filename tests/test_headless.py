@@ -0,0 +1,88 @@
+import json
+import asyncio
+
+import pytest
+
+import tracker
+from tracker import JsonLinesSink, DeliveryError, b58encode
+from stub_rpc import stub_transaction, stub_signature, stub_recipient
+
+
+def test_sink_reconnects_after_peer_closes(tmp_path):
+    path = str(tmp_path / 'det.sock')
+    received = []
+
+    async def handle(reader, writer):
+        # Получатель читает одну строку и закрывает соединение
+        received.append(json.loads(await reader.readline()))
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_unix_server(handle, path)
+        sink = JsonLinesSink(f'unix:{path}')
+        await sink.open()
+        await sink.write({'n': 1})
+        await asyncio.sleep(0.1)
+        await sink.write({'n': 2})
+        await asyncio.sleep(0.1)
+
+        server.close()
+        await server.wait_closed()
+        (tmp_path / 'det.sock').unlink()
+        await asyncio.sleep(0.1)
+        with pytest.raises(OSError):
+            await sink.write({'n': 3})
+        await sink.close()
+
+    asyncio.run(main())
+    assert received == [{'n': 1}, {'n': 2}]
+
+
+def test_undelivered_transaction_is_not_marked_processed(db, monkeypatch):
+    source = b58encode(bytes([3]) * 32)
+    signature = stub_signature(source)
+    tracker.add_source_address(source)
+
+    async def fake_signatures(address, before=None, commitment=None):
+        return [{'signature': signature, 'blockTime': 1700000000}]
+
+    async def fake_raw(sig):
+        return json.dumps({'result': stub_transaction(source)}).encode()
+
+    delivered = []
+
+    async def failing_notify(wallet, *args, **kwargs):
+        raise DeliveryError('получатель недоступен')
+
+    async def notify(wallet, *args, **kwargs):
+        delivered.append(wallet)
+        return True
+
+    monkeypatch.setattr(tracker, 'get_outgoing_transactions', fake_signatures)
+    monkeypatch.setattr(tracker, 'get_transaction_raw', fake_raw)
+
+    asyncio.run(tracker.run_check_pass(failing_notify))
+    assert not tracker.is_transaction_processed(signature)
+
+    asyncio.run(tracker.run_check_pass(notify))
+    assert delivered == [stub_recipient(source)]
+    assert tracker.is_transaction_processed(signature)
+
+
+def test_headless_ignores_fast_mode(db, monkeypatch, tmp_path):
+    tracker.add_source_address(b58encode(b'\x07' * 32))
+    tracker.update_setting('optimistic_notify', 'true')
+    commitments = []
+
+    async def fake_signatures(address, before=None, commitment=None):
+        commitments.append(commitment)
+        return []
+
+    async def notify(*args, **kwargs):
+        return True
+
+    monkeypatch.setattr(tracker, 'get_outgoing_transactions', fake_signatures)
+    # Бот и воркеры (через --notifier) сверяют быстрые уведомления, headless — нет
+    asyncio.run(tracker.run_check_pass(notify))
+    asyncio.run(tracker.run_headless(str(tmp_path / 'out.jsonl'), once=True))
+    assert commitments == ['confirmed', None]
@@ -0,0 +1,35 @@
+import pytest
+
+from tracker import parse_labels
+
+ADDRESS = '8yQ1VsBVqbXMa2dTd5g1WgVG4oqUXFVsmzXDdHUm4uZ3'
+
+
+def test_csv_with_header():
+    text = f"name,address\nBinance,{ADDRESS}\n,{ADDRESS}x\n"
+    assert parse_labels(text) == [(ADDRESS, 'Binance'), (ADDRESS + 'x', '')]
+
+
+def test_csv_without_header():
+    text = f" {ADDRESS} , Kraken \n\n{ADDRESS}\n"
+    assert parse_labels(text, 'labels.csv') == [(ADDRESS, 'Kraken'), (ADDRESS, '')]
+
+
+def test_json_list():
+    text = f'[{{"address": "{ADDRESS}", "name": "OKX"}}, {{"address": "{ADDRESS}"}}]'
+    assert parse_labels(text) == [(ADDRESS, 'OKX'), (ADDRESS, '')]
+
+
+def test_json_dict():
+    assert parse_labels(f'{{"{ADDRESS}": " Bybit "}}', 'labels.json') == [(ADDRESS, 'Bybit')]
+
+
+@pytest.mark.parametrize('text, filename', [
+    ('[1, 2]', ''),
+    ('{"broken": ', ''),
+    ('"not a list"', 'labels.json'),
+    ('42', 'labels.json'),
+])
+def test_invalid_input(text, filename):
+    with pytest.raises(ValueError):
+        parse_labels(text, filename)
@@ -0,0 +1,110 @@
+import os
+import re
+import asyncio
+
+import pytest
+
+import tracker
+from tracker import PassProfiler
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracker, 'PROFILE_DIR', str(tmp_path / 'profiles'))
+    profiler = PassProfiler()
+    monkeypatch.setattr(tracker, 'pass_profiler', profiler)
+    return profiler
+
+
+def stub_pass(monkeypatch, before=None):
+    # Проход: 20 мс в стадии rpc, 10 мс в decode (как время пула) и ~20 мс вне стадий
+    async def check_pass(notify, owns, reconciled):
+        if before:
+            before()
+        with tracker.pass_profiler.stage('rpc'):
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.01)
+        tracker.pass_profiler.add('decode', 0.01)
+        await asyncio.sleep(0.02)
+
+    monkeypatch.setattr(tracker, '_check_pass', check_pass)
+
+
+def stage_seconds(report, name):
+    return float(re.search(rf"^  {name}\s+([\d.]+) с", report, re.M).group(1))
+
+
+def test_profiles_next_passes_and_reports_once(profiler, monkeypatch):
+    done = []
+
+    async def on_done(report, path):
+        done.append((report, path))
+
+    started = {'pass': False}
+
+    def start_mid_pass():
+        # /profile пришел во время первого прохода — он не учитывается
+        if not started['pass']:
+            started['pass'] = True
+            profiler.start(2, on_done)
+
+    stub_pass(monkeypatch, before=start_mid_pass)
+
+    async def main():
+        await tracker.run_check_pass(None)
+        assert profiler.remaining == 2
+        await tracker.run_check_pass(None)
+        assert profiler.remaining == 1
+        await tracker.run_check_pass(None)
+        await tracker.run_check_pass(None)
+
+    asyncio.run(main())
+
+    assert len(done) == 1
+    report, path = done[0]
+    assert os.path.exists(path) and path.endswith('.prof')
+    assert report.startswith("⏱️ Проходов: 2,")
+    assert "остановлено" not in report
+    assert stage_seconds(report, 'rpc') >= 0.04
+    assert stage_seconds(report, 'decode') == pytest.approx(0.02)
+    assert stage_seconds(report, 'other') >= 0.03
+    assert not profiler.active
+
+
+def test_flush_saves_partial_report(profiler, monkeypatch):
+    done = []
+
+    async def on_done(report, path):
+        done.append((report, path))
+
+    stub_pass(monkeypatch)
+    profiler.start(3, on_done)
+
+    async def main():
+        await tracker.run_check_pass(None)
+        await profiler.flush()
+        await profiler.flush()
+
+    asyncio.run(main())
+
+    assert len(done) == 1
+    report, path = done[0]
+    assert os.path.exists(path)
+    assert "Проходов: 1," in report and "из 3 запланированных" in report
+    assert not profiler.active
+
+
+def test_flush_without_passes_writes_nothing(profiler, tmp_path):
+    profiler.start(2)
+    asyncio.run(profiler.flush())
+    assert not profiler.active
+    assert not os.path.exists(tmp_path / 'profiles')
+
+
+def test_headless_once_writes_profile(db, profiler, monkeypatch, tmp_path):
+    stub_pass(monkeypatch)
+    profiler.start(3)
+    asyncio.run(tracker.run_headless(str(tmp_path / 'out.jsonl'), once=True))
+
+    assert len(os.listdir(tmp_path / 'profiles')) == 1
+    assert not profiler.active
@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import json
+import signal
+import socket
+import sqlite3
+import asyncio
+import subprocess
+import urllib.request
+from collections import Counter
+
+import pytest
+
+import tracker
+from tracker import HashRing, b58encode
+from stub_rpc import stub_recipient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_ring_without_members():
+    assert HashRing([]).owner('addr') is None
+
+
+def test_ring_balances_keys():
+    ring = HashRing(['w1', 'w2', 'w3'])
+    owners = Counter(ring.owner(f'key{i}') for i in range(3000))
+    assert set(owners) == {'w1', 'w2', 'w3'}
+    assert all(600 < count < 1400 for count in owners.values())
+
+
+def test_ring_join_moves_keys_only_to_new_member():
+    keys = [f'key{i}' for i in range(2000)]
+    before = HashRing(['w1', 'w2'])
+    after = HashRing(['w1', 'w2', 'w3'])
+    moved = [key for key in keys if before.owner(key) != after.owner(key)]
+    assert moved
+    assert all(after.owner(key) == 'w3' for key in moved)
+
+
+def test_pass_rechecks_owner_per_source(db, monkeypatch):
+    sources = [b58encode(bytes([i]) * 32) for i in range(1, 5)]
+    for address in sources:
+        tracker.add_source_address(address)
+
+    polled = []
+    ring = {'current': HashRing(['w1'])}
+
+    async def fake_signatures(address, before=None, commitment=None):
+        polled.append(address)
+        # Второй воркер входит в кольцо после первого источника
+        ring['current'] = HashRing(['w1', 'w2'])
+        return []
+
+    async def notify(*args, **kwargs):
+        return True
+
+    monkeypatch.setattr(tracker, 'get_outgoing_transactions', fake_signatures)
+    asyncio.run(tracker.run_check_pass(notify, owns=lambda addr: ring['current'].owner(addr) == 'w1'))
+
+    shared = HashRing(['w1', 'w2'])
+    addresses = tracker.subscription_index.addresses()
+    assert polled == addresses[:1] + [a for a in addresses[1:] if shared.owner(a) == 'w1']
+    assert len(polled) < len(sources)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"stub RPC не запустился на порту {port}")
+
+
+@pytest.fixture
+def stub_rpc():
+    port = _free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'tests', 'stub_rpc.py'), '--port', str(port)])
+    try:
+        _wait_for_port(port)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def test_two_workers_split_sources(db, stub_rpc):
+    # Адреса подобраны так, что в кольце ['w1', 'w2'] они делятся 4/4
+    sources = [b58encode(bytes([i]) * 32) for i in range(1, 9)]
+    for address in sources:
+        tracker.add_source_address(address)
+    # Оба воркера в кольце с самого начала, чтобы разбиение было детерминированным
+    tracker.worker_heartbeat('w1')
+    tracker.worker_heartbeat('w2')
+
+    workers = [
+        subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'tracker.py'), '--worker', '--worker-id', worker_id,
+             '--rpc-url', stub_rpc + '/', '--db', db],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        for worker_id in ('w1', 'w2')
+    ]
+    try:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and len(tracker.fetch_detections()) < len(sources):
+            time.sleep(0.2)
+    finally:
+        for process in workers:
+            process.send_signal(signal.SIGTERM)
+        for process in workers:
+            process.wait(timeout=10)
+
+    detections = tracker.fetch_detections()
+    ring = HashRing(['w1', 'w2'])
+    conn = sqlite3.connect(db)
+    owners = dict(conn.execute("SELECT source, worker_id FROM detections").fetchall())
+    conn.close()
+
+    assert sorted(row[1] for row in detections) == sorted(stub_recipient(a) for a in sources)
+    assert owners == {address: ring.owner(address) for address in sources}
+    assert set(owners.values()) == {'w1', 'w2'}
+
+    # Каждый источник опрошен ровно один раз — только своим владельцем
+    # (следующий проход начнется не раньше чем через CHECK_INTERVAL)
+    with urllib.request.urlopen(stub_rpc + '/stats') as response:
+        polled = json.load(response)['polled']
+    assert polled == {address: 1 for address in sources}
+
+    # После SIGTERM воркеры освобождают свои шарды
+    assert tracker.get_live_workers() == []
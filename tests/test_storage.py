@@ -0,0 +1,79 @@
+import os
+import sqlite3
+import multiprocessing
+
+import pytest
+
+import tracker
+from tracker import b58decode, b58encode
+
+
+@pytest.mark.parametrize('data', [b'', b'\0', b'\0\0\1', b'\xff' * 32, os.urandom(32), os.urandom(64)])
+def test_b58_roundtrip(data):
+    assert b58decode(b58encode(data)) == data
+
+
+def test_b58_known_values():
+    assert b58encode(b'\0' * 32) == '1' * 32
+    assert b58decode('11111111111111111111111111111111') == b'\0' * 32
+    assert b58encode(b'hello world') == 'StV1DL6CwTryKyV'
+
+
+@pytest.mark.parametrize('text', ['0OIl', 'abc0', 'адрес', 'abc def'])
+def test_b58_rejects_invalid_characters(text):
+    with pytest.raises(ValueError):
+        b58decode(text)
+
+
+def create_legacy_db(path, signatures, wallets):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sources (address TEXT PRIMARY KEY)")
+    conn.execute("CREATE TABLE processed_txs (signature TEXT PRIMARY KEY, timestamp INTEGER)")
+    conn.execute("CREATE TABLE notified_wallets (wallet_address TEXT PRIMARY KEY)")
+    conn.executemany("INSERT INTO processed_txs VALUES (?, 1)", [(s,) for s in signatures])
+    conn.executemany("INSERT INTO notified_wallets VALUES (?)", [(w,) for w in wallets])
+    conn.commit()
+    conn.close()
+
+
+def test_migration_converts_legacy_tables(tmp_path, monkeypatch):
+    path = str(tmp_path / 'legacy.db')
+    signatures = [b58encode(os.urandom(64)) for _ in range(50)]
+    wallets = [b58encode(os.urandom(32)) for _ in range(50)]
+    create_legacy_db(path, signatures, wallets + ['not-base58!'])
+    monkeypatch.setattr(tracker, 'DB_PATH', path)
+
+    tracker.init_db()
+    tracker.init_db()  # повторный запуск ничего не меняет
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT typeof(signature) FROM processed_txs LIMIT 1").fetchone() == ('blob',)
+    assert conn.execute("SELECT COUNT(*) FROM notified_wallets").fetchone() == (50,)
+    conn.close()
+    assert all(tracker.is_transaction_processed(s) for s in signatures)
+    assert all(tracker.is_wallet_notified(w) for w in wallets)
+
+
+def _init(path, barrier):
+    tracker.DB_PATH = path
+    barrier.wait()
+    tracker.init_db()
+
+
+def test_concurrent_migration_keeps_rows(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    signatures = [b58encode(os.urandom(64)) for _ in range(3000)]
+    create_legacy_db(path, signatures, [])
+
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(4)
+    processes = [context.Process(target=_init, args=(path, barrier)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM processed_txs").fetchone() == (len(signatures),)
+    conn.close()
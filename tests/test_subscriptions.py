@@ -0,0 +1,50 @@
+import pytest
+
+import tracker
+from tracker import b58encode
+
+
+def _address(i):
+    return b58encode(i.to_bytes(2, 'big') * 16)
+
+
+def test_chat_limit(db, monkeypatch):
+    monkeypatch.setattr(tracker, 'MAX_SUBSCRIPTIONS_PER_CHAT', 2)
+    assert tracker.subscribe_chat(1, _address(1))
+    assert tracker.subscribe_chat(1, _address(2))
+    with pytest.raises(ValueError):
+        tracker.subscribe_chat(1, _address(3))
+
+
+def test_global_limit_counts_each_address_once(db, monkeypatch):
+    monkeypatch.setattr(tracker, 'MAX_SUBSCRIBED_ADDRESSES', 2)
+    tracker.add_source_address(_address(100))
+
+    assert tracker.subscribe_chat(1, _address(1))
+    assert tracker.subscribe_chat(2, _address(1))
+    assert tracker.subscribe_chat(2, _address(2))
+    # Новый адрес сверх общего бюджета отклоняется для любого чата
+    with pytest.raises(ValueError):
+        tracker.subscribe_chat(3, _address(3))
+    # Уже опрашиваемые адреса бюджет не расходуют
+    assert tracker.subscribe_chat(3, _address(2))
+    assert tracker.subscribe_chat(3, _address(100))
+
+    # Отклоненная попытка не оставляет подписчика без подписок
+    with pytest.raises(ValueError):
+        tracker.subscribe_chat(4, _address(4))
+    addresses, filters = tracker.get_chat_subscriptions(4)
+    assert addresses == [] and filters is None
+
+    tracker.subscription_index.reload()
+    assert sorted(tracker.subscription_index.addresses()) == sorted([_address(100), _address(1), _address(2)])
+    assert len(tracker.subscription_index.match(_address(1))) == 2
+
+
+def test_unsubscribe_frees_global_budget(db, monkeypatch):
+    monkeypatch.setattr(tracker, 'MAX_SUBSCRIBED_ADDRESSES', 1)
+    assert tracker.subscribe_chat(1, _address(1))
+    with pytest.raises(ValueError):
+        tracker.subscribe_chat(2, _address(2))
+    assert tracker.unsubscribe_chat(1, _address(1))
+    assert tracker.subscribe_chat(2, _address(2))
@@ -0,0 +1,73 @@
+import asyncio
+
+from aiohttp import web
+
+import tracker
+from tracker import b58encode
+
+MINT = b58encode(b'\x0b' * 32)
+NOT_MINT = b58encode(b'\x0c' * 32)
+
+
+def mint_account(decimals):
+    return {'data': {'parsed': {'type': 'mint', 'info': {'decimals': decimals}}}}
+
+
+async def with_rpc(responses, check, monkeypatch):
+    # Ответы по очереди: (HTTP-статус, тело)
+    async def rpc(request):
+        status, body = responses.pop(0)
+        return web.json_response(body, status=status)
+
+    app = web.Application()
+    app.router.add_post('/', rpc)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    monkeypatch.setattr(tracker, 'SOLANA_RPC_URL', f'http://127.0.0.1:{port}/')
+    try:
+        await check()
+    finally:
+        await runner.cleanup()
+
+
+def test_failed_request_does_not_mark_unresolved(db, monkeypatch):
+    tracker.set_token_range(MINT, 1, 50)
+    tracker.set_token_range(NOT_MINT, 1, 50)
+    registry = tracker.token_registry
+    registry.reload()
+    registry.unresolved.clear()
+
+    responses = [
+        (503, {}),
+        (200, {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32005, 'message': 'Node is behind'}}),
+        (200, {'jsonrpc': '2.0', 'id': 1, 'result': {'value': [mint_account(6), None]}}),
+    ]
+
+    async def check():
+        # HTTP-ошибка и ошибка JSON-RPC: минты остаются в очереди на запрос
+        await tracker.refresh_token_metadata()
+        assert registry.unresolved == set()
+        await tracker.refresh_token_metadata()
+        assert registry.unresolved == set()
+
+        # RPC ответил: минт получил decimals, аккаунт без данных помечен
+        await tracker.refresh_token_metadata()
+        assert registry.tokens[MINT].decimals == 6
+        assert registry.unresolved == {NOT_MINT}
+        assert registry.missing_metadata() == []
+
+    asyncio.run(with_rpc(responses, check, monkeypatch))
+    assert responses == []
+
+
+def test_network_error_does_not_mark_unresolved(db, monkeypatch):
+    tracker.set_token_range(MINT, 1, 50)
+    tracker.token_registry.reload()
+    tracker.token_registry.unresolved.clear()
+    monkeypatch.setattr(tracker, 'SOLANA_RPC_URL', 'http://127.0.0.1:9/')
+
+    asyncio.run(tracker.refresh_token_metadata())
+    assert tracker.token_registry.missing_metadata() == [MINT]
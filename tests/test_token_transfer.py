@@ -0,0 +1,156 @@
+from tracker import analyze_transaction, find_token_transfer, b58encode, TOKEN_PROGRAMS
+
+TOKEN_PROGRAM = sorted(TOKEN_PROGRAMS)[0]
+SYSTEM_PROGRAM = '11111111111111111111111111111111'
+DEX_PROGRAM = b58encode(b'\x09' * 32)
+LAMPORTS = 1_000_000_000
+FEE = 5000
+
+
+def _key(n):
+    return b58encode(bytes([n]) * 32)
+
+
+SOURCE, RECIPIENT, POOL = _key(1), _key(2), _key(3)
+MINT_A, MINT_B, MINT_C = _key(11), _key(12), _key(13)
+SETTINGS = {'min_amount': '0.5', 'max_amount': '10'}
+
+
+def transfer_data(amount, checked=False):
+    if checked:
+        return b58encode(b'\x0c' + amount.to_bytes(8, 'little') + b'\x00')
+    return b58encode(b'\x03' + amount.to_bytes(8, 'little'))
+
+
+def balance(index, mint, owner, amount):
+    return {'accountIndex': index, 'mint': mint, 'owner': owner,
+            'uiTokenAmount': {'amount': str(amount), 'decimals': 0}}
+
+
+def make_tx(keys, instructions, token_balances, lamports=None):
+    """token_balances: [(индекс, минт, владелец, было, стало)]; lamports: {индекс: (было, стало)}"""
+    lamports = lamports or {}
+    return {
+        'transaction': {'message': {'accountKeys': keys, 'instructions': instructions}},
+        'meta': {
+            'err': None,
+            'fee': FEE,
+            'preBalances': [lamports.get(i, (LAMPORTS, LAMPORTS))[0] for i in range(len(keys))],
+            'postBalances': [lamports.get(i, (LAMPORTS, LAMPORTS))[1] for i in range(len(keys))],
+            'preTokenBalances': [balance(i, mint, owner, pre) for i, mint, owner, pre, _ in token_balances],
+            'postTokenBalances': [balance(i, mint, owner, post) for i, mint, owner, _, post in token_balances],
+        }
+    }
+
+
+def token_transfer_tx(amount):
+    # 0 источник (подписант), 1 его токен-счет, 2 получатель, 3 токен-счет получателя, 4 программа токенов
+    keys = [SOURCE, _key(21), RECIPIENT, _key(22), TOKEN_PROGRAM]
+    return keys, [{'programIdIndex': 4, 'accounts': [1, 3, 0], 'data': transfer_data(amount)}], [
+        (1, MINT_A, SOURCE, 1000, 1000 - amount),
+        (3, MINT_A, RECIPIENT, 0, amount),
+    ]
+
+
+def test_token_transfer_detected():
+    keys, instructions, balances = token_transfer_tx(20)
+    tx = make_tx(keys, instructions, balances)
+    settings = dict(SETTINGS, token_ranges={MINT_A: (1, 50, None)})
+    found, recipient, amount, _, mint = analyze_transaction(tx, SOURCE, settings, check_notified=False)
+    assert (found, recipient, amount, mint) == (True, RECIPIENT, 20, MINT_A)
+
+
+def test_sol_transfer_found_when_token_out_of_range():
+    # 1 SOL получателю и списание 100 единиц токена с диапазоном 1-50
+    keys, instructions, balances = token_transfer_tx(100)
+    keys = keys + [_key(4), SYSTEM_PROGRAM]
+    instructions = instructions + [{'programIdIndex': 6, 'accounts': [0, 5], 'data': ''}]
+    lamports = {0: (10 * LAMPORTS, 9 * LAMPORTS - FEE), 5: (0, LAMPORTS)}
+    tx = make_tx(keys, instructions, balances, lamports)
+    settings = dict(SETTINGS, token_ranges={MINT_A: (1, 50, None)})
+
+    found, recipient, amount, _, mint = analyze_transaction(tx, SOURCE, settings, check_notified=False)
+    assert (found, recipient, amount, mint) == (True, _key(4), 1.0, None)
+
+
+def test_out_of_range_token_without_sol_transfer():
+    keys, instructions, balances = token_transfer_tx(100)
+    tx = make_tx(keys, instructions, balances, {0: (LAMPORTS, LAMPORTS - FEE)})
+    settings = dict(SETTINGS, token_ranges={MINT_A: (1, 50, None)})
+    found, recipient, _, info, _ = analyze_transaction(tx, SOURCE, settings, check_notified=False)
+    assert (found, recipient) == (False, None)
+    assert MINT_A in info
+
+
+def test_transfer_checked_uses_instruction_accounts():
+    keys, _, balances = token_transfer_tx(20)
+    keys = keys + [MINT_A]
+    instructions = [{'programIdIndex': 4, 'accounts': [1, 5, 3, 0], 'data': transfer_data(20, checked=True)}]
+    tx = make_tx(keys, instructions, balances)
+    # decimals минта из реестра важнее decimals из транзакции
+    assert find_token_transfer(tx['transaction']['message'], tx['meta'], SOURCE, {MINT_A: (1, 50, 2)}) == \
+        (RECIPIENT, MINT_A, 0.2, False)
+
+
+def test_two_mints_follow_instruction_order():
+    # Два отслеживаемых минта: берется первый перевод в диапазоне по порядку инструкций
+    keys = [SOURCE, _key(21), _key(22), _key(23), _key(24), TOKEN_PROGRAM, RECIPIENT, POOL]
+    instructions = [
+        {'programIdIndex': 5, 'accounts': [1, 3, 0], 'data': transfer_data(500)},
+        {'programIdIndex': 5, 'accounts': [2, 4, 0], 'data': transfer_data(30)},
+    ]
+    balances = [
+        (1, MINT_A, SOURCE, 1000, 500),
+        (2, MINT_B, SOURCE, 1000, 970),
+        (3, MINT_A, POOL, 0, 500),
+        (4, MINT_B, RECIPIENT, 0, 30),
+    ]
+    tx = make_tx(keys, instructions, balances)
+    ranges = {MINT_A: (1, 50, None), MINT_B: (1, 50, None)}
+    for _ in range(20):
+        assert find_token_transfer(tx['transaction']['message'], tx['meta'], SOURCE, ranges) == \
+            (RECIPIENT, MINT_B, 30, True)
+
+    # Оба вне диапазона — первый по порядку, без переключения на другой минт
+    ranges = {MINT_A: (1, 10, None), MINT_B: (1, 10, None)}
+    assert find_token_transfer(tx['transaction']['message'], tx['meta'], SOURCE, ranges) == \
+        (POOL, MINT_A, 500, False)
+
+
+def test_credit_is_paired_with_debit_not_largest():
+    # Крупнейшее зачисление (3-я сторона, другая инструкция) не приписывается источнику
+    keys = [SOURCE, _key(21), RECIPIENT, _key(22), TOKEN_PROGRAM, _key(5), _key(25), _key(26)]
+    instructions = [
+        {'programIdIndex': 4, 'accounts': [1, 3, 0], 'data': transfer_data(20)},
+        {'programIdIndex': 4, 'accounts': [6, 7, 5], 'data': transfer_data(900)},
+    ]
+    balances = [
+        (1, MINT_A, SOURCE, 1000, 980),
+        (3, MINT_A, RECIPIENT, 0, 20),
+        (6, MINT_A, _key(5), 1000, 100),
+        (7, MINT_A, POOL, 0, 900),
+    ]
+    tx = make_tx(keys, instructions, balances)
+    assert find_token_transfer(tx['transaction']['message'], tx['meta'], SOURCE, {MINT_A: (1, 50, None)}) == \
+        (RECIPIENT, MINT_A, 20, True)
+
+
+def test_swap_is_not_reported():
+    # Своп: программа DEX переводит токен A в хранилище пула и возвращает источнику токен B
+    keys = [SOURCE, _key(21), _key(22), _key(23), _key(24), POOL, DEX_PROGRAM, TOKEN_PROGRAM]
+    instructions = [{'programIdIndex': 6, 'accounts': [0, 1, 2, 3, 4, 5, 7], 'data': ''}]
+    balances = [
+        (1, MINT_A, SOURCE, 1000, 980),
+        (2, MINT_C, SOURCE, 0, 55),
+        (3, MINT_A, POOL, 5000, 5020),
+        (4, MINT_C, POOL, 9000, 8945),
+    ]
+    tx = make_tx(keys, instructions, balances, {0: (LAMPORTS, LAMPORTS - FEE)})
+    settings = dict(SETTINGS, token_ranges={MINT_A: (1, 50, None)})
+    found, recipient, *_ = analyze_transaction(tx, SOURCE, settings, check_notified=False)
+    assert (found, recipient) == (False, None)
+
+    # Даже если перевод в пул вынесен в инструкцию верхнего уровня, встречный перевод выдает своп
+    instructions = [{'programIdIndex': 7, 'accounts': [1, 3, 0], 'data': transfer_data(20)}] + instructions
+    tx = make_tx(keys, instructions, balances, {0: (LAMPORTS, LAMPORTS - FEE)})
+    assert find_token_transfer(tx['transaction']['message'], tx['meta'], SOURCE, {MINT_A: (1, 50, None)}) is None
@@ -0,0 +1,64 @@
+import sqlite3
+
+from tracker import TransferGraph
+
+
+def test_add_edge_links_without_rereading_nodes(db):
+    graph = TransferGraph()
+    graph.load()
+    graph.nodes['Watched'] = {'root': 'Src', 'depth': 1, 'expires_at': 0, 'last_active': 0}
+
+    graph.add_edge('Src', 'Rcv', 1.5, 'sig1', 1700000000)
+
+    assert graph.edges == {'Src': {'Rcv': 1.5}}
+    assert graph.incoming == {'Rcv': {'Src'}}
+    # Узел только в памяти: add_edge не перечитывает trace_nodes
+    assert 'Watched' in graph.nodes
+
+
+def test_edges_from_other_writers_are_loaded_once(db):
+    graph = TransferGraph()
+    graph.load()
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO trace_edges VALUES ('A', 'B', 'sig0', 1.0, 0)")
+    conn.commit()
+    conn.close()
+
+    graph.add_edge('B', 'C', 2.0, 'sig1', 0)
+    graph.refresh()
+
+    assert graph.edges == {'A': {'B': 1.0}, 'B': {'C': 2.0}}
+
+
+def test_trim_evicts_coldest_nodes(db):
+    graph = TransferGraph()
+    graph.load()
+    for i in range(5):
+        graph.promote(f'W{i}', 'Src', 1, 3600, 10)
+        graph.nodes[f'W{i}']['last_active'] = i
+
+    graph.trim(2)
+
+    assert sorted(graph.nodes) == ['W3', 'W4']
+    reloaded = TransferGraph()
+    reloaded.load()
+    assert sorted(reloaded.nodes) == ['W3', 'W4']
+
+
+def test_promote_keeps_cap(db):
+    graph = TransferGraph()
+    graph.load()
+    for i in range(5):
+        graph.promote(f'W{i}', 'Src', 1, 3600, 3)
+    assert len(graph.nodes) == 3
+    assert 'W4' in graph.nodes
+
+
+def test_find_paths_handles_cycles(db):
+    graph = TransferGraph()
+    graph.load()
+    graph.add_edge('A', 'B', 1.0, 's1', 0)
+    graph.add_edge('B', 'C', 1.0, 's2', 0)
+    graph.add_edge('C', 'A', 1.0, 's3', 0)
+
+    assert graph.find_paths('C') == [['A', 'B', 'C']]
@@ -0,0 +1,2063 @@
+"""
+Ядро трекера: база данных, RPC Solana, анализ транзакций и проход проверки источников.
+Модуль не зависит от python-telegram-bot; Telegram-бот (bot.py) подключает его сам.
+
+Headless-режим (без Telegram, обнаруженные переводы в формате JSON Lines):
+    python tracker.py                              # в stdout
+    python tracker.py --output detections.jsonl    # в файл
+    python tracker.py --output unix:/tmp/det.sock  # в Unix-сокет
+    python tracker.py --worker                     # шард источников для bot.py --notifier
+    python tracker.py --profile 3                  # профилировать первые 3 прохода
+"""
+import sqlite3
+import asyncio
+import aiohttp
+import logging
+from datetime import datetime, timedelta, timezone
+import re
+import json
+import csv
+import io
+import os
+import sys
+import socket
+import bisect
+import hashlib
+import argparse
+import signal
+import time
+import cProfile
+import multiprocessing
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Настройка логирования (в stderr: stdout занят выводом headless-режима)
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+SOLANA_RPC_URL = "https://api.devnet.solana.com"  # SOLANA_RPC_URL = "https://api.mainnet-beta.solana.com"
+DB_PATH = "solana_tracker.db"
+CHECK_INTERVAL = 15  # Интервал проверки источников, секунд
+WORKER_LEASE_TTL = 3 * CHECK_INTERVAL  # Воркер без heartbeat дольше этого считается ушедшим
+WORKER_HEARTBEAT_INTERVAL = CHECK_INTERVAL / 3  # Продление lease и перечитывание кольца, в т.ч. во время прохода
+MAX_SUBSCRIPTIONS_PER_CHAT = 100  # Ограничение на число адресов одного чата (бюджет опроса RPC)
+MAX_SUBSCRIBED_ADDRESSES = 1000  # Сколько разных адресов всего могут добавить подписчики сверх sources
+ALERT_DROP_TIMEOUT = 120  # Транзакция, не найденная за это время, считается выброшенной (blockhash истек)
+PROFILE_DIR = "profiles"  # Куда сохраняются полные профили проходов (/profile, --profile)
+PROFILE_TOP = 15  # Сколько горячих точек показывать в отчете
+
+
+# Программы SPL Token и Token-2022 и коды их инструкций перевода (первый байт data)
+TOKEN_PROGRAMS = {
+    'TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA',
+    'TokenzQdBNbLqP5VEhdkAS6EPFLC1PDnBkcxHeSCnp5',
+}
+TOKEN_TRANSFER = b'\x03'
+TOKEN_TRANSFER_CHECKED = b'\x0c'
+
+# Base58 (алфавит Bitcoin/Solana)
+B58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+# Символ -> цифра 0..57 одним bytes.translate (в C), недопустимые символы — для проверки
+_B58_DIGITS = bytes.maketrans(B58_ALPHABET.encode('ascii'), bytes(range(58)))
+_B58_INVALID = bytes(code for code in range(256) if chr(code) not in B58_ALPHABET)
+
+
+# Проход повторно проверяет одни и те же последние подписи источников: они берутся из кэша
+@lru_cache(maxsize=65536)
+def b58decode(text):
+    try:
+        raw = text.encode('ascii')
+    except UnicodeEncodeError:
+        raw = None
+    if raw is None or raw.translate(None, _B58_INVALID) != raw:
+        raise ValueError(f"Недопустимый символ base58 в {text!r}")
+
+    # В цикле Python остается только арифметика над готовыми цифрами
+    num = 0
+    for digit in raw.translate(_B58_DIGITS):
+        num = num * 58 + digit
+    # Ведущие '1' кодируют нулевые байты
+    pad = len(raw) - len(raw.lstrip(b'1'))
+    return b'\0' * pad + num.to_bytes((num.bit_length() + 7) // 8, 'big')
+
+
+def b58encode(data):
+    num = int.from_bytes(data, 'big')
+    chars = []
+    while num:
+        num, rem = divmod(num, 58)
+        chars.append(B58_ALPHABET[rem])
+    pad = len(data) - len(data.lstrip(b'\0'))
+    return '1' * pad + ''.join(reversed(chars))
+
+
+# Таблицы с ключом base58, хранимым как BLOB: таблица -> описание колонок (ключ первый)
+BLOB_KEY_TABLES = {
+    'sources': 'address BLOB PRIMARY KEY',
+    'processed_txs': 'signature BLOB PRIMARY KEY, timestamp INTEGER',
+    'notified_wallets': 'wallet_address BLOB PRIMARY KEY',
+}
+
+
+def migrate_blob_keys(conn):
+    """
+    Переводит таблицы старого формата (base58 TEXT, rowid-таблицы) в BLOB WITHOUT ROWID
+    Каждая таблица переносится в отдельной транзакции; после переноса файл сжимается VACUUM
+    """
+    cursor = conn.cursor()
+    migrated = False
+
+    def legacy_columns(table):
+        cursor.execute(f"PRAGMA table_info({table})")
+        info = cursor.fetchall()
+        return info if info and info[0][2].upper() == 'TEXT' else None
+
+    for table, columns in BLOB_KEY_TABLES.items():
+        if not legacy_columns(table):
+            continue
+
+        # IMMEDIATE сразу берет блокировку записи: воркер, запущенный одновременно, ждет ее
+        # и после перепроверки видит уже переведенную таблицу, а не читает BLOB как base58
+        cursor.execute("BEGIN IMMEDIATE")
+        info = legacy_columns(table)
+        if not info:
+            conn.rollback()
+            continue
+
+        cursor.execute(f"SELECT * FROM {table}")
+        rows, skipped = [], []
+        for row in cursor.fetchall():
+            try:
+                rows.append((b58decode(row[0]),) + tuple(row[1:]))
+            except ValueError:
+                skipped.append(row[0])
+
+        placeholders = ', '.join('?' * len(info))
+        cursor.execute(f"CREATE TABLE {table}_blob ({columns}) WITHOUT ROWID")
+        cursor.executemany(f"INSERT OR IGNORE INTO {table}_blob VALUES ({placeholders})", rows)
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_blob RENAME TO {table}")
+        conn.commit()
+        migrated = True
+
+        logger.info(f"🗜️ Таблица {table} переведена в BLOB: {len(rows)} записей")
+        if skipped:
+            logger.warning(f"⚠️ {table}: пропущены значения, не являющиеся base58: {skipped}")
+
+    if migrated:
+        try:
+            cursor.execute("VACUUM")
+        except sqlite3.OperationalError as e:
+            # БД занята другим процессом: место освободится при следующем запуске
+            logger.warning(f"⚠️ VACUUM после миграции пропущен: {e}")
+
+
+# Инициализация базы данных
+def init_db():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    # Перевод таблиц старого формата (base58 TEXT) в BLOB
+    migrate_blob_keys(conn)
+
+    # WAL позволяет нескольким процессам-воркерам читать и писать БД одновременно.
+    # Только на одном хосте: WAL требует общей памяти (-shm) и не работает на сетевых ФС
+    cursor.execute("PRAGMA journal_mode=WAL")
+
+    # Таблицы адресов-источников, обработанных транзакций и уведомленных кошельков:
+    # подписи (64 байта) и адреса (32 байта) хранятся в декодированном виде
+    for table, columns in BLOB_KEY_TABLES.items():
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns}) WITHOUT ROWID")
+
+    # Таблица настроек
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''')
+
+    # Граф переводов: ребра источник -> получатель
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS trace_edges (
+        source TEXT,
+        recipient TEXT,
+        signature TEXT,
+        amount REAL,
+        timestamp INTEGER,
+        PRIMARY KEY (source, recipient, signature)
+    )
+    ''')
+
+    # Временно отслеживаемые кошельки (узлы трассировки)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS trace_nodes (
+        address TEXT PRIMARY KEY,
+        root TEXT,
+        depth INTEGER,
+        expires_at INTEGER,
+        last_active INTEGER
+    )
+    ''')
+
+    # Воркеры шардированного опроса и их heartbeat
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS workers (
+        worker_id TEXT PRIMARY KEY,
+        heartbeat INTEGER
+    )
+    ''')
+
+    # Очередь обнаруженных переводов от воркеров к единому отправителю уведомлений
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS detections (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        wallet_address TEXT,
+        amount REAL,
+        source TEXT,
+        timestamp INTEGER,
+        hop_depth INTEGER,
+        hop_root TEXT,
+        worker_id TEXT
+    )
+    ''')
+
+    # Метки адресов (биржи и т.п.)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS exchanges (
+        name TEXT,
+        address TEXT PRIMARY KEY
+    )
+    ''')
+
+    # Обнаруженные новые кошельки с меткой источника
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS new_wallets (
+        wallet_address TEXT PRIMARY KEY,
+        first_seen INTEGER,
+        amount REAL,
+        exchange_source TEXT
+    )
+    ''')
+
+    # Подписчики: чаты со своими фильтрами суммы и часовым поясом
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS subscribers (
+        chat_id INTEGER PRIMARY KEY,
+        min_amount REAL,
+        max_amount REAL,
+        timezone INTEGER
+    )
+    ''')
+
+    # Подписки чатов на адреса-источники
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS subscriptions (
+        chat_id INTEGER,
+        address BLOB,
+        PRIMARY KEY (chat_id, address)
+    ) WITHOUT ROWID
+    ''')
+
+    # Уведомления, отправленные до финализации транзакции (режим быстрых уведомлений)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS pending_alerts (
+        signature BLOB,
+        chat_id INTEGER,
+        wallet_address TEXT,
+        message_id INTEGER,
+        text TEXT,
+        created_at INTEGER,
+        PRIMARY KEY (signature, chat_id)
+    ) WITHOUT ROWID
+    ''')
+
+    # Отслеживаемые SPL-токены: диапазон сумм и кэш метаданных минта (decimals, symbol)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS token_mints (
+        mint BLOB PRIMARY KEY,
+        symbol TEXT,
+        decimals INTEGER,
+        min_amount REAL,
+        max_amount REAL
+    ) WITHOUT ROWID
+    ''')
+
+    # Подпись транзакции в очереди находок (для базы, созданной до появления колонки)
+    cursor.execute("PRAGMA table_info(detections)")
+    detection_columns = [column[1] for column in cursor.fetchall()]
+    if 'signature' not in detection_columns:
+        cursor.execute("ALTER TABLE detections ADD COLUMN signature TEXT")
+
+    # Минт токена для переводов SPL (NULL — перевод SOL)
+    if 'token' not in detection_columns:
+        cursor.execute("ALTER TABLE detections ADD COLUMN token TEXT")
+    cursor.execute("PRAGMA table_info(new_wallets)")
+    if 'token' not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE new_wallets ADD COLUMN token TEXT")
+
+    # Инициализация настроек по умолчанию
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('min_amount', '0.001')")
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('max_amount', '10')")
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('timezone', '5')")
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('notify_all_transactions', 'true')")
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('optimistic_notify', 'false')")
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('labels_version', '0')")
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('tokens_version', '0')")
+
+    # Настройки трассировки средств (multi-hop)
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('trace_enabled', 'false')")
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('trace_depth', '2')")
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('trace_ttl', '3600')")
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('trace_max_nodes', '50')")
+
+    conn.commit()
+    conn.close()
+
+
+# Очистка тестовых данных
+def clear_test_data():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM processed_txs")
+    cursor.execute("DELETE FROM notified_wallets")
+    conn.commit()
+    conn.close()
+    logger.info("✅ Тестовые данные очищены")
+
+
+# Получение настроек из БД
+def get_settings():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT key, value FROM settings")
+    settings = {row[0]: row[1] for row in cursor.fetchall()}
+    conn.close()
+    return settings
+
+
+# Обновление настроек в БД
+def update_setting(key, value):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+    conn.commit()
+    conn.close()
+
+
+# Работа с адресами-источниками
+def add_source_address(address):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT OR IGNORE INTO sources (address) VALUES (?)", (b58decode(address),))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка добавления адреса: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def delete_source_address(address):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM sources WHERE address = ?", (b58decode(address),))
+        conn.commit()
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка удаления адреса: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def get_source_addresses():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT address FROM sources")
+    addresses = [b58encode(row[0]) for row in cursor.fetchall()]
+    conn.close()
+    return addresses
+
+
+# Проверка обработки транзакции
+def is_transaction_processed(signature):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM processed_txs WHERE signature = ?", (b58decode(signature),))
+    result = cursor.fetchone()
+    conn.close()
+    return result is not None
+
+
+def mark_transaction_processed(signature):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("INSERT OR IGNORE INTO processed_txs (signature, timestamp) VALUES (?, ?)",
+                   (b58decode(signature), int(datetime.now().timestamp())))
+    conn.commit()
+    conn.close()
+
+
+# Проверка уведомления о кошельке
+def is_wallet_notified(wallet_address):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM notified_wallets WHERE wallet_address = ?", (b58decode(wallet_address),))
+    result = cursor.fetchone()
+    conn.close()
+    return result is not None
+
+
+def mark_wallet_notified(wallet_address):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("INSERT OR IGNORE INTO notified_wallets (wallet_address) VALUES (?)",
+                   (b58decode(wallet_address),))
+    conn.commit()
+    conn.close()
+
+
+def unmark_wallet_notified(wallet_address):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM notified_wallets WHERE wallet_address = ?", (b58decode(wallet_address),))
+    conn.commit()
+    conn.close()
+
+
+# Уведомления, ожидающие финализации транзакции
+def add_pending_alert(signature, wallet_address, chat_id, message_id, text):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT OR REPLACE INTO pending_alerts "
+        "(signature, wallet_address, chat_id, message_id, text, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (b58decode(signature), wallet_address, chat_id, message_id, text, int(datetime.now().timestamp()))
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_pending_alerts(limit=256):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT signature, wallet_address, chat_id, message_id, text, created_at "
+        "FROM pending_alerts ORDER BY created_at LIMIT ?",
+        (limit,)
+    )
+    alerts = [(b58encode(row[0]),) + tuple(row[1:]) for row in cursor.fetchall()]
+    conn.close()
+    return alerts
+
+
+def delete_pending_alert(signature, chat_id):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM pending_alerts WHERE signature = ? AND chat_id = ?",
+                   (b58decode(signature), chat_id))
+    conn.commit()
+    conn.close()
+
+
+# Метки адресов: биржи и другие известные кошельки
+class LabelRegistry:
+    """
+    Словарь адрес -> метка в памяти, без запросов к БД на каждый перевод.
+    Перечитывается только при изменении настройки labels_version (после импорта).
+    """
+
+    def __init__(self):
+        self.labels = {}
+        self.version = None
+
+    def reload(self):
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        cursor.execute("SELECT address, name FROM exchanges")
+        self.labels = dict(cursor.fetchall())
+        cursor.execute("SELECT value FROM settings WHERE key = 'labels_version'")
+        row = cursor.fetchone()
+        self.version = row[0] if row else None
+        conn.close()
+        logger.info(f"🏷️ Загружено меток адресов: {len(self.labels)}")
+
+    def refresh(self, settings):
+        if settings.get('labels_version') != self.version:
+            self.reload()
+
+    def get(self, address):
+        return self.labels.get(address)
+
+
+label_registry = LabelRegistry()
+
+
+def parse_labels(text, filename=''):
+    """
+    Разбирает список меток из CSV или JSON
+    CSV: колонки address,name (заголовок необязателен); JSON: [{"address", "name"}] или {адрес: метка}
+    Возвращает список пар (адрес, метка)
+    """
+    try:
+        if filename.lower().endswith('.json') or text.lstrip()[:1] in ('[', '{'):
+            data = json.loads(text)
+            if isinstance(data, dict):
+                return [(str(address).strip(), str(name).strip()) for address, name in data.items()]
+            return [(str(entry.get('address', '')).strip(), str(entry.get('name', '')).strip())
+                    for entry in data]
+
+        rows = [row for row in csv.reader(io.StringIO(text)) if row and any(cell.strip() for cell in row)]
+    except (csv.Error, AttributeError, TypeError) as e:
+        raise ValueError(f"Неверный формат файла: {e}")
+
+    if rows and 'address' in [cell.strip().lower() for cell in rows[0]]:
+        header = [cell.strip().lower() for cell in rows[0]]
+        address_col = header.index('address')
+        name_col = header.index('name') if 'name' in header else None
+        rows = rows[1:]
+    else:
+        address_col, name_col = 0, 1
+
+    entries = []
+    for row in rows:
+        address = row[address_col].strip() if address_col < len(row) else ''
+        name = row[name_col].strip() if name_col is not None and name_col < len(row) else ''
+        entries.append((address, name))
+    return entries
+
+
+def import_labels(entries, add_sources=True):
+    """
+    Импортирует метки (и адреса-источники) одной транзакцией
+    Возвращает кортеж (число_импортированных, список_некорректных_адресов)
+    """
+    valid, invalid = [], []
+    for address, name in entries:
+        if is_valid_solana_address(address):
+            valid.append((name or None, address))
+        else:
+            invalid.append(address)
+
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("INSERT OR REPLACE INTO exchanges (name, address) VALUES (?, ?)",
+                           [(name, address) for name, address in valid if name])
+        if add_sources:
+            cursor.executemany("INSERT OR IGNORE INTO sources (address) VALUES (?)",
+                               [(b58decode(address),) for _, address in valid])
+        cursor.execute("UPDATE settings SET value = CAST(value AS INTEGER) + 1 WHERE key = 'labels_version'")
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logger.error(f"Ошибка импорта меток: {e}")
+        return 0, invalid
+    finally:
+        conn.close()
+
+    label_registry.reload()
+    logger.info(f"🏷️ Импортировано адресов: {len(valid)}, некорректных: {len(invalid)}")
+    return len(valid), invalid
+
+
+# Отслеживаемые SPL-токены
+TokenInfo = namedtuple('TokenInfo', ['symbol', 'decimals', 'min_amount', 'max_amount'])
+
+
+def set_token_range(mint, min_amount, max_amount, symbol=None):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    # Кэш метаданных сохраняется; символ администратора заменяет найденный в минте
+    cursor.execute(
+        "INSERT INTO token_mints (mint, symbol, min_amount, max_amount) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(mint) DO UPDATE SET min_amount = excluded.min_amount, max_amount = excluded.max_amount, "
+        "symbol = COALESCE(excluded.symbol, symbol)",
+        (b58decode(mint), symbol, min_amount, max_amount)
+    )
+    cursor.execute("UPDATE settings SET value = CAST(value AS INTEGER) + 1 WHERE key = 'tokens_version'")
+    conn.commit()
+    conn.close()
+
+
+def delete_token(mint):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM token_mints WHERE mint = ?", (b58decode(mint),))
+    deleted = cursor.rowcount > 0
+    cursor.execute("UPDATE settings SET value = CAST(value AS INTEGER) + 1 WHERE key = 'tokens_version'")
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+def update_token_metadata(metadata):
+    # metadata: {минт: (decimals, symbol)}; символ из минта не затирает заданный вручную
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.executemany(
+        "UPDATE token_mints SET decimals = ?, symbol = COALESCE(symbol, ?) WHERE mint = ?",
+        [(decimals, symbol, b58decode(mint)) for mint, (decimals, symbol) in metadata.items()]
+    )
+    cursor.execute("UPDATE settings SET value = CAST(value AS INTEGER) + 1 WHERE key = 'tokens_version'")
+    conn.commit()
+    conn.close()
+
+
+class TokenRegistry:
+    """
+    Словарь минт -> TokenInfo в памяти: диапазоны сумм и метаданные без запросов на каждый перевод.
+    Перечитывается при изменении настройки tokens_version, как и реестр меток.
+    """
+
+    def __init__(self):
+        self.tokens = {}
+        self.version = None
+        self.unresolved = set()  # минты без метаданных в RPC: не запрашиваются повторно каждый проход
+
+    def reload(self):
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        cursor.execute("SELECT mint, symbol, decimals, min_amount, max_amount FROM token_mints")
+        self.tokens = {b58encode(mint): TokenInfo(*info) for mint, *info in cursor.fetchall()}
+        cursor.execute("SELECT value FROM settings WHERE key = 'tokens_version'")
+        row = cursor.fetchone()
+        self.version = row[0] if row else None
+        conn.close()
+
+    def refresh(self, settings):
+        if settings.get('tokens_version') != self.version:
+            self.reload()
+
+    def missing_metadata(self):
+        return [mint for mint, info in self.tokens.items() if info.decimals is None and mint not in self.unresolved]
+
+    def ranges(self):
+        # Компактное представление для analyze_transaction (передается и в пул процессов)
+        return {mint: (info.min_amount, info.max_amount, info.decimals) for mint, info in self.tokens.items()}
+
+    def symbol(self, mint):
+        info = self.tokens.get(mint)
+        return info.symbol if info and info.symbol else f"{mint[:4]}…{mint[-4:]}"
+
+
+token_registry = TokenRegistry()
+
+
+def record_new_wallet(wallet_address, first_seen, amount, exchange_source, token=None):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT OR IGNORE INTO new_wallets (wallet_address, first_seen, amount, exchange_source, token) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (wallet_address, first_seen, amount, exchange_source, token)
+    )
+    conn.commit()
+    conn.close()
+
+
+# Подписки чатов на адреса-источники.
+# Превышение лимитов — ValueError с текстом для пользователя, ошибка БД — False
+def subscribe_chat(chat_id, address):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    try:
+        # Новый подписчик получает фильтры из глобальных настроек
+        cursor.execute(
+            "INSERT OR IGNORE INTO subscribers (chat_id, min_amount, max_amount, timezone) "
+            "SELECT ?, "
+            "(SELECT CAST(value AS REAL) FROM settings WHERE key = 'min_amount'), "
+            "(SELECT CAST(value AS REAL) FROM settings WHERE key = 'max_amount'), "
+            "(SELECT CAST(value AS INTEGER) FROM settings WHERE key = 'timezone')",
+            (chat_id,)
+        )
+        key = b58decode(address)
+        cursor.execute("SELECT COUNT(*) FROM subscriptions WHERE chat_id = ?", (chat_id,))
+        if cursor.fetchone()[0] >= MAX_SUBSCRIPTIONS_PER_CHAT:
+            raise ValueError(f"Максимум адресов на чат: {MAX_SUBSCRIPTIONS_PER_CHAT}")
+        # Адрес, который уже опрашивается (sources или подписка другого чата), опрос не удорожает.
+        # Новые адреса ограничены общим бюджетом на всех подписчиков
+        cursor.execute(
+            "SELECT EXISTS(SELECT 1 FROM sources WHERE address = ?) "
+            "OR EXISTS(SELECT 1 FROM subscriptions WHERE address = ?)",
+            (key, key)
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                "SELECT COUNT(DISTINCT address) FROM subscriptions "
+                "WHERE address NOT IN (SELECT address FROM sources)"
+            )
+            if cursor.fetchone()[0] >= MAX_SUBSCRIBED_ADDRESSES:
+                raise ValueError(f"Достигнут общий лимит отслеживаемых адресов: {MAX_SUBSCRIBED_ADDRESSES}")
+        cursor.execute("INSERT OR IGNORE INTO subscriptions (chat_id, address) VALUES (?, ?)",
+                       (chat_id, key))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка добавления подписки: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def unsubscribe_chat(chat_id, address):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM subscriptions WHERE chat_id = ? AND address = ?",
+                   (chat_id, b58decode(address)))
+    conn.commit()
+    removed = cursor.rowcount > 0
+    conn.close()
+    return removed
+
+
+def get_chat_subscriptions(chat_id):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT address FROM subscriptions WHERE chat_id = ?", (chat_id,))
+    addresses = [b58encode(row[0]) for row in cursor.fetchall()]
+    cursor.execute("SELECT min_amount, max_amount, timezone FROM subscribers WHERE chat_id = ?", (chat_id,))
+    filters = cursor.fetchone()
+    conn.close()
+    return addresses, filters
+
+
+def update_subscriber(chat_id, **fields):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    for column, value in fields.items():
+        if column not in ('min_amount', 'max_amount', 'timezone'):
+            raise ValueError(f"Неизвестный параметр подписчика: {column}")
+        cursor.execute(f"UPDATE subscribers SET {column} = ? WHERE chat_id = ?", (value, chat_id))
+    conn.commit()
+    updated = cursor.rowcount > 0
+    conn.close()
+    return updated
+
+
+Subscriber = namedtuple('Subscriber', ['chat_id', 'min_amount', 'max_amount', 'tz'])
+
+
+class SubscriptionIndex:
+    """
+    Индекс в памяти: адрес-источник -> подписчики с заранее подготовленными фильтрами.
+    Подбор получателей для перевода стоит O(подписчиков источника), без запросов к БД.
+    Адреса из таблицы sources принадлежат администратору с глобальными настройками.
+    """
+
+    def __init__(self):
+        self.admin_chat_id = None  # задается ботом; без него адреса sources только опрашиваются
+        self.by_source = {}  # адрес -> список Subscriber
+        self.ranges = {}  # адрес -> (минимум, максимум) по всем подписчикам
+        self.overall = (0.0, float('inf'))
+
+    def reload(self):
+        settings = get_settings()
+        admin = Subscriber(
+            self.admin_chat_id,
+            float(settings['min_amount']),
+            float(settings['max_amount']),
+            timezone(timedelta(hours=int(settings.get('timezone', '0'))))
+        )
+
+        by_chat = {}  # адрес -> {chat_id: Subscriber}, чтобы чат не получал дубли
+        for address in get_source_addresses():
+            by_chat.setdefault(address, {})[admin.chat_id] = admin
+
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT s.address, c.chat_id, c.min_amount, c.max_amount, c.timezone "
+            "FROM subscriptions s JOIN subscribers c ON c.chat_id = s.chat_id"
+        )
+        for address, chat_id, min_amount, max_amount, tz_offset in cursor.fetchall():
+            subscriber = Subscriber(chat_id, min_amount, max_amount, timezone(timedelta(hours=tz_offset)))
+            by_chat.setdefault(b58encode(address), {})[chat_id] = subscriber
+        conn.close()
+
+        self.by_source = {address: list(subs.values()) for address, subs in by_chat.items()}
+        self.ranges = {
+            address: (min(s.min_amount for s in subs), max(s.max_amount for s in subs))
+            for address, subs in self.by_source.items()
+        }
+        if self.ranges:
+            self.overall = (min(r[0] for r in self.ranges.values()), max(r[1] for r in self.ranges.values()))
+
+    def addresses(self):
+        return list(self.by_source)
+
+    def amount_range(self, address):
+        # Для узлов трассировки подписчиков нет — берем самый широкий диапазон
+        return self.ranges.get(address, self.overall)
+
+    def match(self, source, amount=None):
+        # amount=None — перевод токена: диапазон минта уже проверен при анализе
+        return [
+            subscriber for subscriber in self.by_source.get(source, ())
+            if subscriber.chat_id is not None
+            and (amount is None or subscriber.min_amount <= amount <= subscriber.max_amount)
+        ]
+
+
+subscription_index = SubscriptionIndex()
+
+
+# Граф переводов для трассировки средств по цепочке кошельков
+class TransferGraph:
+    """
+    Граф переводов отправитель -> получатель в памяти.
+    Ребра и временно отслеживаемые узлы инкрементально сохраняются в SQLite,
+    запросы /trace обслуживаются только из памяти, без обращений к RPC.
+    """
+
+    def __init__(self):
+        self.edges = {}  # отправитель -> {получатель: сумма в SOL}
+        self.incoming = {}  # получатель -> множество отправителей
+        self.nodes = {}  # адрес -> {'root', 'depth', 'expires_at', 'last_active'}
+        self.last_rowid = 0  # последнее загруженное ребро из trace_edges
+
+    def load(self):
+        self.refresh()
+        logger.info(f"🕸️ Граф переводов загружен: {len(self.edges)} отправителей, {len(self.nodes)} узлов")
+
+    def refresh(self):
+        # Догружаем только новые ребра (по rowid) и перечитываем узлы:
+        # так граф остается согласованным, когда в БД пишут несколько воркеров
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        self._load_edges(cursor)
+        cursor.execute("SELECT address, root, depth, expires_at, last_active FROM trace_nodes")
+        self.nodes = {
+            address: {
+                'root': root,
+                'depth': depth,
+                'expires_at': expires_at,
+                'last_active': last_active
+            }
+            for address, root, depth, expires_at, last_active in cursor.fetchall()
+        }
+        conn.close()
+
+    def _load_edges(self, cursor):
+        cursor.execute(
+            "SELECT rowid, source, recipient, amount FROM trace_edges WHERE rowid > ? ORDER BY rowid",
+            (self.last_rowid,)
+        )
+        for rowid, source, recipient, amount in cursor.fetchall():
+            self._link(source, recipient, amount)
+            self.last_rowid = rowid
+
+    def _link(self, source, recipient, amount):
+        targets = self.edges.setdefault(source, {})
+        targets[recipient] = targets.get(recipient, 0) + amount
+        self.incoming.setdefault(recipient, set()).add(source)
+
+    def _save_node(self, address):
+        node = self.nodes[address]
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO trace_nodes (address, root, depth, expires_at, last_active) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (address, node['root'], node['depth'], node['expires_at'], node['last_active'])
+        )
+        conn.commit()
+        conn.close()
+
+    def _drop_nodes(self, addresses):
+        for address in addresses:
+            self.nodes.pop(address, None)
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        cursor.executemany("DELETE FROM trace_nodes WHERE address = ?", [(a,) for a in addresses])
+        conn.commit()
+        conn.close()
+
+    def add_edge(self, source, recipient, amount, signature, timestamp):
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR IGNORE INTO trace_edges (source, recipient, signature, amount, timestamp) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (source, recipient, signature, amount, timestamp)
+        )
+        conn.commit()
+        # Узлы не перечитываем: догружаем новое ребро (и ребра других воркеров после него)
+        self._load_edges(cursor)
+        conn.close()
+
+    def touch(self, address, ttl):
+        # Активный узел продлевает свое время жизни и не считается "холодным"
+        node = self.nodes.get(address)
+        if node is None:
+            return
+        now = int(datetime.now().timestamp())
+        node['last_active'] = now
+        node['expires_at'] = now + ttl
+        self._save_node(address)
+
+    def promote(self, address, root, depth, ttl, max_nodes):
+        now = int(datetime.now().timestamp())
+        node = self.nodes.get(address)
+        if node is not None:
+            node['depth'] = min(node['depth'], depth)
+            node['expires_at'] = max(node['expires_at'], now + ttl)
+            self._save_node(address)
+            return
+
+        if max_nodes <= 0:
+            return
+
+        # Освобождаем место под новый узел
+        self.trim(max_nodes - 1)
+        self.nodes[address] = {
+            'root': root,
+            'depth': depth,
+            'expires_at': now + ttl,
+            'last_active': now
+        }
+        self._save_node(address)
+        logger.info(f"🕸️ Кошелек {address} добавлен в трассировку (глубина {depth}, корень {root})")
+
+    def trim(self, max_nodes):
+        # Ограничиваем размер набора: вытесняем самые "холодные" узлы
+        overflow = len(self.nodes) - max_nodes
+        if overflow > 0:
+            evicted = sorted(self.nodes, key=lambda a: self.nodes[a]['last_active'])[:overflow]
+            self._drop_nodes(evicted)
+            logger.info(f"🧊 Вытеснено холодных узлов трассировки: {len(evicted)}")
+
+    def expire(self):
+        now = int(datetime.now().timestamp())
+        expired = [a for a, node in self.nodes.items() if node['expires_at'] <= now]
+        if expired:
+            self._drop_nodes(expired)
+            logger.info(f"⌛ Истекло узлов трассировки: {len(expired)}")
+
+    def find_paths(self, wallet, max_depth=10, limit=5):
+        """
+        Ищет цепочки переводов, ведущие к кошельку, обходя граф в обратную сторону
+        Возвращает список путей [корень, ..., wallet]
+        """
+        paths = []
+        stack = [[wallet]]
+        while stack and len(paths) < limit:
+            path = stack.pop()
+            senders = [a for a in self.incoming.get(path[0], ()) if a not in path]
+            if not senders or len(path) > max_depth:
+                if len(path) > 1:
+                    paths.append(path)
+                continue
+            for sender in senders:
+                stack.append([sender] + path)
+        return paths
+
+
+transfer_graph = TransferGraph()
+
+
+# Шардирование источников между воркерами
+def _ring_hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Консистентное хеширование адресов по воркерам.
+    При входе или уходе воркера переезжает только его доля адресов.
+    """
+
+    def __init__(self, members, replicas=64):
+        self.points = sorted(
+            (_ring_hash(f"{member}#{i}"), member)
+            for member in members
+            for i in range(replicas)
+        )
+        self.keys = [point[0] for point in self.points]
+
+    def owner(self, key):
+        if not self.points:
+            return None
+        index = bisect.bisect(self.keys, _ring_hash(key)) % len(self.points)
+        return self.points[index][1]
+
+
+def worker_heartbeat(worker_id):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("INSERT OR REPLACE INTO workers (worker_id, heartbeat) VALUES (?, ?)",
+                   (worker_id, int(datetime.now().timestamp())))
+    conn.commit()
+    conn.close()
+
+
+def worker_unregister(worker_id):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+    conn.commit()
+    conn.close()
+
+
+def get_live_workers():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT worker_id FROM workers WHERE heartbeat >= ?",
+                   (int(datetime.now().timestamp()) - WORKER_LEASE_TTL,))
+    workers = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return workers
+
+
+# Очередь обнаруженных переводов
+def enqueue_detection(wallet, amount, source, timestamp, hop, worker_id, signature=None, token=None):
+    depth, root = hop or (None, None)
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO detections "
+        "(wallet_address, amount, source, timestamp, hop_depth, hop_root, worker_id, signature, token) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (wallet, amount, source, timestamp, depth, root, worker_id, signature, token)
+    )
+    conn.commit()
+    conn.close()
+
+
+def fetch_detections(limit=100):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, wallet_address, amount, source, timestamp, hop_depth, hop_root, signature, token "
+        "FROM detections ORDER BY id LIMIT ?",
+        (limit,)
+    )
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def delete_detections(ids):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.executemany("DELETE FROM detections WHERE id = ?", [(i,) for i in ids])
+    conn.commit()
+    conn.close()
+
+
+# Валидация адреса Solana
+def is_valid_solana_address(address):
+    if re.match(r'^[1-9A-HJ-NP-Za-km-z]{32,44}$', address) is None:
+        return False
+    # Публичный ключ — ровно 32 байта после декодирования
+    return len(b58decode(address)) == 32
+
+
+# Получение исходящих транзакций с адреса
+async def get_outgoing_transactions(address, before=None, commitment=None):
+    options = {
+        "limit": 10,
+        "before": before
+    }
+    # По умолчанию RPC отдает подписи только на уровне finalized
+    if commitment:
+        options["commitment"] = commitment
+
+    payload = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "getSignaturesForAddress",
+        "params": [address, options]
+    }
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(SOLANA_RPC_URL, json=payload, timeout=10) as response:
+                if response.status != 200:
+                    logger.error(f"Ошибка получения транзакций: HTTP {response.status}")
+                    logger.error(f"Ответ: {await response.text()}")
+                    return []
+                result = await response.json()
+                return result.get('result', [])
+    except Exception as e:
+        logger.error(f"Ошибка получения транзакций для {address}: {e}")
+        return []
+
+
+# Статусы подтверждения пачки транзакций (до 256 подписей за запрос)
+async def get_signature_statuses(signatures):
+    payload = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "getSignatureStatuses",
+        "params": [
+            signatures,
+            {
+                "searchTransactionHistory": True
+            }
+        ]
+    }
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(SOLANA_RPC_URL, json=payload, timeout=10) as response:
+                if response.status != 200:
+                    logger.error(f"Ошибка получения статусов транзакций: HTTP {response.status}")
+                    return None
+                result = await response.json()
+                return result.get('result', {}).get('value')
+    except Exception as e:
+        logger.error(f"Ошибка получения статусов транзакций: {e}")
+        return None
+
+
+# Метаданные минтов SPL-токенов одним запросом getMultipleAccounts (до 100 адресов)
+async def get_mint_metadata(mints):
+    """
+    Возвращает кортеж (словарь минт -> (decimals, symbol), список_не_минтов); symbol есть только
+    у минтов Token-2022 с расширением tokenMetadata, у классических SPL-токенов он None
+    В список не-минтов попадают только адреса, на которые RPC ответил (аккаунта нет или это не минт);
+    минты из неудавшихся запросов не попадают никуда и будут запрошены снова
+    """
+    metadata = {}
+    invalid = []
+    for start in range(0, len(mints), 100):
+        chunk = mints[start:start + 100]
+        payload = {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "getMultipleAccounts",
+            "params": [chunk, {"encoding": "jsonParsed"}]
+        }
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(SOLANA_RPC_URL, json=payload, timeout=10) as response:
+                    if response.status != 200:
+                        logger.error(f"Ошибка получения метаданных токенов: HTTP {response.status}")
+                        continue
+                    result = await response.json()
+        except Exception as e:
+            logger.error(f"Ошибка получения метаданных токенов: {e}")
+            continue
+
+        values = (result.get('result') or {}).get('value')
+        if not isinstance(values, list):
+            logger.error(f"Ошибка получения метаданных токенов: {result.get('error')}")
+            continue
+
+        for mint, account in zip(chunk, values):
+            data = account.get('data') if isinstance(account, dict) else None
+            parsed = data.get('parsed') if isinstance(data, dict) else None
+            if not isinstance(parsed, dict) or parsed.get('type') != 'mint':
+                logger.warning(f"⚠️ Аккаунт {mint} не является минтом SPL-токена")
+                invalid.append(mint)
+                continue
+            info = parsed.get('info', {})
+            symbol = None
+            for extension in info.get('extensions', []):
+                if extension.get('extension') == 'tokenMetadata':
+                    symbol = extension.get('state', {}).get('symbol') or None
+            metadata[mint] = (info.get('decimals'), symbol)
+    return metadata, invalid
+
+
+# Догрузка метаданных для минтов, которых еще нет в кэше (один запрос на все)
+async def refresh_token_metadata():
+    missing = token_registry.missing_metadata()
+    if not missing:
+        return
+    metadata, invalid = await get_mint_metadata(missing)
+    # Сбой запроса не помечает минты: они будут запрошены в следующем проходе
+    token_registry.unresolved.update(invalid)
+    if metadata:
+        update_token_metadata(metadata)
+        token_registry.reload()
+        logger.info(f"🪙 Загружены метаданные токенов: {len(metadata)}")
+
+
+# Получение деталей транзакции (сырые байты ответа, без разбора JSON)
+async def get_transaction_raw(signature):
+    payload = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "getTransaction",
+        "params": [
+            signature,
+            {
+                "encoding": "json",
+                "commitment": "confirmed",
+                "maxSupportedTransactionVersion": 0
+            }
+        ]
+    }
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(SOLANA_RPC_URL, json=payload, timeout=10) as response:
+                if response.status != 200:
+                    logger.error(f"Ошибка получения деталей транзакции: HTTP {response.status}")
+                    logger.error(f"Ответ: {await response.text()}")
+                    return None
+                return await response.read()
+    except Exception as e:
+        logger.error(f"Ошибка получения деталей транзакции {signature}: {e}")
+        return None
+
+
+# Получение деталей транзакции
+async def get_transaction_details(signature):
+    raw = await get_transaction_raw(signature)
+    if raw is None:
+        return None
+    try:
+        return json.loads(raw).get('result')
+    except ValueError as e:
+        logger.error(f"Ошибка разбора деталей транзакции {signature}: {e}")
+        return None
+
+
+# Анализ транзакции для поиска переводов SOL от нашего источника
+def analyze_transaction(tx_details, source_address, settings, check_notified=True):
+    """
+    Анализирует транзакцию для поиска переводов SOL и отслеживаемых SPL-токенов от указанного источника
+    Возвращает кортеж (найден_перевод, адрес_получателя, сумма, информация_для_лога, минт_токена);
+    минт None означает перевод SOL, иначе сумма указана в единицах токена
+    При check_notified=False проверка уведомленных кошельков (запрос к БД) пропускается
+    """
+    try:
+        if not tx_details or 'transaction' not in tx_details or 'meta' not in tx_details:
+            logger.debug("❌ Транзакция не содержит необходимых данных")
+            return False, None, 0, "Некорректная структура транзакции", None
+
+        transaction = tx_details['transaction']
+        meta = tx_details['meta']
+
+        if 'message' not in transaction:
+            logger.debug("❌ Транзакция не содержит секции message")
+            return False, None, 0, "Отсутствует секция message", None
+
+        message = transaction['message']
+        account_keys = message.get('accountKeys', [])
+
+        if not account_keys:
+            logger.debug("❌ Транзакция не содержит accountKeys")
+            return False, None, 0, "Отсутствуют accountKeys", None
+
+        logger.debug(f"📋 Счета в транзакции: {account_keys}")
+
+        # Находим индекс нашего адреса-источника
+        try:
+            source_index = account_keys.index(source_address)
+        except ValueError:
+            logger.debug(f"⏭️ Адрес источника {source_address} не найден в транзакции")
+            return False, None, 0, "Источник не найден в транзакции", None
+
+        # Переводы SPL-токенов: балансы токен-счетов уже есть в meta этой же транзакции
+        token_ranges = settings.get('token_ranges')
+        skipped_token = None  # перевод токена вне диапазона; перевод SOL в той же транзакции еще проверяется
+        if token_ranges:
+            transfer = find_token_transfer(message, meta, source_address, token_ranges)
+            if transfer:
+                recipient, mint, amount, in_range = transfer
+                if not in_range:
+                    logger.debug(f"⏭️ Сумма {amount} токена {mint} вне диапазона")
+                    skipped_token = f"Сумма токена {mint} вне диапазона: {amount}"
+                elif check_notified and is_wallet_notified(recipient):
+                    logger.debug(f"⏭️ Кошелек {recipient} уже был уведомлен ранее")
+                    return False, None, 0, "Кошелек уже был уведомлен", None
+                else:
+                    logger.info(f"✅ Обнаружен перевод токена: {source_address} -> {recipient}, сумма: {amount} {mint}")
+                    return True, recipient, amount, f"Перевод токена обнаружен: {amount} {mint} к {recipient}", mint
+
+        # Проверяем изменения баланса для нашего адреса
+        if 'preBalances' not in meta or 'postBalances' not in meta:
+            logger.debug("❌ Отсутствуют данные о балансах в meta")
+            return False, None, 0, "Отсутствуют данные о балансах", None
+
+        pre_balance = meta['preBalances'][source_index]
+        post_balance = meta['postBalances'][source_index]
+        fee = meta.get('fee', 0)
+
+        # Изменение баланса = предыдущий баланс - текущий баланс - комиссия
+        balance_change = pre_balance - post_balance - fee
+
+        # Если баланс увеличился, это не исходящий перевод
+        if balance_change <= 0:
+            logger.debug(f"⏭️ Баланс адреса-источника не уменьшился (изменение: {balance_change})")
+            return False, None, 0, skipped_token or "Нет исходящего перевода с источника", None
+
+        # Переводим lamports в SOL
+        amount_sol = balance_change / 1_000_000_000
+
+        # Проверяем фильтры суммы
+        min_amount = float(settings['min_amount'])
+        max_amount = float(settings['max_amount'])
+
+        if not (min_amount <= amount_sol <= max_amount):
+            logger.debug(f"⏭️ Сумма {amount_sol:.6f} SOL вне диапазона ({min_amount}-{max_amount})")
+            return False, None, 0, skipped_token or f"Сумма вне диапазона: {amount_sol:.6f} SOL", None
+
+        # Теперь ищем получателя перевода
+        # Для этого анализируем инструкции на предмет перевода
+        instructions = message.get('instructions', [])
+        recipient = None
+
+        for instruction in instructions:
+            # Случай 1: Распарсенная инструкция
+            if 'parsed' in instruction and 'info' in instruction['parsed']:
+                parsed = instruction['parsed']
+                info = parsed['info']
+                instruction_type = parsed.get('type', '')
+
+                if instruction_type == 'transfer':
+                    if info.get('source') == source_address:
+                        recipient = info.get('destination')
+                        break
+
+            # Случай 2: Сырая инструкция для системного перевода
+            elif 'programIdIndex' in instruction:
+                program_id_index = instruction['programIdIndex']
+                if program_id_index < len(account_keys) and account_keys[
+                    program_id_index] == '11111111111111111111111111111111':
+                    # Это системная инструкция
+                    accounts = instruction.get('accounts', [])
+                    if len(accounts) >= 3:
+                        source_acc_index = accounts[0]  # Отправитель обычно первый
+                        dest_acc_index = accounts[1]  # Получатель обычно второй
+
+                        if source_acc_index < len(account_keys) and dest_acc_index < len(account_keys):
+                            if account_keys[source_acc_index] == source_address:
+                                recipient = account_keys[dest_acc_index]
+                                break
+
+        # Если не нашли получателя через инструкции, пробуем другой метод
+        if not recipient:
+            # Находим аккаунт, баланс которого увеличился примерно на сумму перевода.
+            # Токен-счета (например, рента нового счета получателя токена) кошельками не являются
+            token_accounts = {balance.get('accountIndex') for balance in meta.get('postTokenBalances') or ()}
+            for i, (pre, post) in enumerate(zip(meta['preBalances'], meta['postBalances'])):
+                if i == source_index or i in token_accounts:
+                    continue
+
+                balance_diff = post - pre
+                # Учитываем погрешность из-за комиссий
+                if abs(balance_diff - balance_change) < 1000000:  # 0.001 SOL в lamports
+                    recipient = account_keys[i]
+                    break
+
+        if not recipient:
+            logger.debug("⏭️ Не удалось определить получателя перевода")
+            return False, None, 0, "Получатель не определен", None
+
+        # Проверяем, не уведомляли ли уже об этом кошельке
+        if check_notified and is_wallet_notified(recipient):
+            logger.debug(f"⏭️ Кошелек {recipient} уже был уведомлен ранее")
+            return False, None, 0, "Кошелек уже был уведомлен", None
+
+        logger.info(f"✅ Обнаружен перевод: {source_address} -> {recipient}, сумма: {amount_sol:.6f} SOL")
+        return True, recipient, amount_sol, f"Перевод обнаружен: {amount_sol:.6f} SOL к {recipient}", None
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка анализа транзакции: {e}")
+        logger.exception("Полная ошибка:")
+        return False, None, 0, f"Ошибка анализа: {str(e)}", None
+
+
+def find_token_transfer(message, meta, source_address, token_ranges):
+    """
+    Ищет перевод отслеживаемого SPL-токена от источника по инструкциям Transfer/TransferChecked
+    Счета списания и зачисления берутся из самой инструкции, их владельцы и минт — из pre/postTokenBalances
+    Учитываются только инструкции верхнего уровня: переводы из вызовов других программ (свопы DEX)
+    пропускаются, как и транзакции, в которых источник сам получает токены
+    token_ranges: {минт: (минимум, максимум, decimals)}; decimals None — берутся из транзакции
+    Возвращает (владелец_счета_получателя, минт, сумма, сумма_в_диапазоне) для первого перевода в диапазоне,
+    иначе для первого перевода вне диапазона, или None
+    """
+    # Индекс счета -> (минт, владелец, decimals)
+    accounts = {}
+    pre_amounts = {}
+    for balance in meta.get('preTokenBalances') or ():
+        amount = balance.get('uiTokenAmount', {})
+        accounts[balance.get('accountIndex')] = (balance.get('mint'), balance.get('owner'), amount.get('decimals'))
+        pre_amounts[balance.get('accountIndex')] = int(amount.get('amount', 0))
+    for balance in meta.get('postTokenBalances') or ():
+        amount = balance.get('uiTokenAmount', {})
+        index, owner = balance.get('accountIndex'), balance.get('owner')
+        accounts[index] = (balance.get('mint'), owner, amount.get('decimals'))
+        if owner == source_address and int(amount.get('amount', 0)) > pre_amounts.get(index, 0):
+            # Источник получил токены в обмен — это своп, а не выплата
+            return None
+
+    account_keys = message.get('accountKeys', [])
+    found = None
+    for instruction in message.get('instructions', []):
+        program_index = instruction.get('programIdIndex')
+        if program_index is None or program_index >= len(account_keys) \
+                or account_keys[program_index] not in TOKEN_PROGRAMS:
+            continue
+        try:
+            data = b58decode(instruction.get('data', ''))
+        except ValueError:
+            continue
+        indexes = instruction.get('accounts', [])
+        # Transfer: [источник, получатель, владелец]; TransferChecked: [источник, минт, получатель, владелец]
+        if data[:1] == TOKEN_TRANSFER and len(data) >= 9 and len(indexes) >= 2:
+            debit, credit = accounts.get(indexes[0]), accounts.get(indexes[1])
+        elif data[:1] == TOKEN_TRANSFER_CHECKED and len(data) >= 10 and len(indexes) >= 3:
+            debit, credit = accounts.get(indexes[0]), accounts.get(indexes[2])
+        else:
+            continue
+        if not debit or not credit or debit[1] != source_address or credit[1] in (None, source_address):
+            continue
+
+        mint = debit[0]
+        if mint not in token_ranges:
+            continue
+        min_amount, max_amount, decimals = token_ranges[mint]
+        if decimals is None:
+            decimals = debit[2] or 0
+        amount = int.from_bytes(data[1:9], 'little') / 10 ** decimals
+        if min_amount <= amount <= max_amount:
+            return credit[1], mint, amount, True
+        found = found or (credit[1], mint, amount, False)
+    return found
+
+
+# Разбор и анализ пачки ответов getTransaction; выполняется в пуле процессов
+def decode_transaction_batch(raw_responses, source_address, settings):
+    """
+    Разбирает сырые ответы getTransaction и анализирует их
+    Возвращает список компактных записей (найден_перевод, получатель, сумма, информация_для_лога, минт)
+    или None для ответов без данных транзакции, а также время разбора JSON и анализа в секундах
+    """
+    records = []
+    decode_time = analyze_time = 0.0
+    for raw in raw_responses:
+        started = time.perf_counter()
+        try:
+            tx_details = json.loads(raw).get('result')
+        except ValueError:
+            tx_details = None
+        decoded = time.perf_counter()
+        decode_time += decoded - started
+        if not tx_details:
+            records.append(None)
+            continue
+        records.append(analyze_transaction(tx_details, source_address, settings, check_notified=False))
+        analyze_time += time.perf_counter() - decoded
+    return records, decode_time, analyze_time
+
+
+# Пул процессов для разбора транзакций (None — разбор в цикле событий)
+decode_pool = None
+decode_pool_workers = 0
+
+
+def start_decode_pool(workers=0):
+    global decode_pool, decode_pool_workers
+    # Одно ядро оставляем циклу событий (Telegram и сетевой ввод-вывод)
+    decode_pool_workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    # spawn: дочерние процессы не наследуют потоки JobQueue и HTTP-клиента
+    decode_pool = ProcessPoolExecutor(max_workers=decode_pool_workers,
+                                      mp_context=multiprocessing.get_context('spawn'))
+    logger.info(f"🧮 Пул разбора транзакций запущен: {decode_pool_workers} процессов")
+
+
+async def decode_transactions(raw_responses, source_address, settings):
+    pool = decode_pool
+    if pool is None:
+        records, decode_time, analyze_time = decode_transaction_batch(raw_responses, source_address, settings)
+    else:
+        loop = asyncio.get_running_loop()
+        try:
+            records, decode_time, analyze_time = await loop.run_in_executor(
+                pool, decode_transaction_batch, raw_responses, source_address, settings
+            )
+        except BrokenProcessPool:
+            # Дочерний процесс упал (OOM, kill): пул больше не принимает задачи.
+            # Перезапускаем его один раз на все параллельные пачки, эту пачку разбираем в цикле событий
+            if decode_pool is pool:
+                logger.error("💥 Пул разбора транзакций упал, перезапуск")
+                pool.shutdown(wait=False, cancel_futures=True)
+                start_decode_pool(decode_pool_workers)
+            records, decode_time, analyze_time = decode_transaction_batch(raw_responses, source_address, settings)
+    # Время стадий замеряется внутри пакета: в пуле процессов разбор идет параллельно с RPC
+    pass_profiler.add('decode', decode_time)
+    pass_profiler.add('analyze', analyze_time)
+    return records
+
+
+# Профилирование проходов проверки (/profile в боте, --profile в headless-режиме)
+class PassProfiler:
+    """
+    Оборачивает следующие N проходов в cProfile и суммирует время по стадиям.
+    Стадии замеряются по настенным часам, включая ожидание await; после
+    последнего прохода профиль сохраняется в PROFILE_DIR, а отчет передается в on_done.
+    """
+
+    STAGES = ('rpc', 'decode', 'analyze', 'db', 'notify')
+
+    def __init__(self):
+        self.remaining = 0
+        self.planned = 0
+        self.profile = None
+        self.on_done = None
+        self.stages = {}
+        self.pass_times = []
+        self.pass_started = None
+
+    @property
+    def active(self):
+        return self.remaining > 0
+
+    def start(self, passes, on_done=None):
+        self.remaining = passes
+        self.planned = passes
+        self.on_done = on_done
+        self.profile = cProfile.Profile()
+        self.stages = dict.fromkeys(self.STAGES, 0.0)
+        self.pass_times = []
+        self.pass_started = None
+
+    def begin_pass(self):
+        if not self.active:
+            return
+        self.pass_started = time.perf_counter()
+        self.profile.enable()
+
+    async def end_pass(self):
+        # Проход, начавшийся до /profile, не учитывается
+        if self.pass_started is None:
+            return
+        self.profile.disable()
+        self.pass_times.append(time.perf_counter() - self.pass_started)
+        self.pass_started = None
+        self.remaining -= 1
+        if self.remaining > 0:
+            return
+        await self._finish()
+
+    async def flush(self):
+        # Прогон остановлен раньше N проходов (--once, SIGTERM, Ctrl+C): сохраняем частичный отчет
+        if self.pass_started is not None:
+            await self.end_pass()
+        if self.active and self.pass_times:
+            await self._finish()
+        self.remaining = 0
+
+    async def _finish(self):
+        report, path = self.report()
+        on_done, self.on_done, self.profile = self.on_done, None, None
+        self.remaining = 0
+        logger.info(f"⏱️ Профиль сохранен: {path}")
+        if on_done is not None:
+            try:
+                await on_done(report, path)
+            except Exception as e:
+                logger.error(f"❌ Ошибка отправки отчета профилирования: {e}")
+                logger.info(report)
+        else:
+            logger.info(report)
+
+    @contextmanager
+    def stage(self, name):
+        if self.pass_started is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - started
+
+    def add(self, name, seconds):
+        if self.pass_started is not None:
+            self.stages[name] += seconds
+
+    def report(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"check-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.prof")
+        self.profile.dump_stats(path)
+
+        total = sum(self.pass_times)
+        passes = len(self.pass_times)
+        lines = [f"⏱️ Проходов: {passes}, всего {total:.2f} с, в среднем {total / passes:.2f} с"]
+        if passes < self.planned:
+            lines[0] += f" (остановлено, из {self.planned} запланированных)"
+        lines += ["", "Стадии:"]
+        for name in self.STAGES + ('other',):
+            seconds = self.stages[name] if name != 'other' else max(0.0, total - sum(self.stages.values()))
+            share = seconds / total if total else 0.0
+            lines.append(f"  {name:<8}{seconds:9.3f} с {share:7.1%}")
+
+        # Горячие точки по собственному времени функции (без вызываемых)
+        stats = self.profile.getstats()
+        lines += ["", "Горячие точки (собств. / общее время, вызовы):"]
+        for entry in sorted(stats, key=lambda e: e.inlinetime, reverse=True)[:PROFILE_TOP]:
+            code = entry.code
+            if isinstance(code, str):
+                where = code
+            else:
+                where = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            lines.append(f"  {entry.inlinetime:7.3f} {entry.totaltime:7.3f} {entry.callcount:7d}  {where}")
+        return '\n'.join(lines), path
+
+
+pass_profiler = PassProfiler()
+
+
+class DeliveryError(Exception):
+    """Находку не удалось вывести (получатель недоступен): транзакция будет проверена повторно"""
+
+
+# Один проход проверки; owns ограничивает адреса шардом текущего воркера.
+# reconciled=False — у вызывающего нет сверки быстрых уведомлений (headless): /setfast не действует
+async def run_check_pass(notify, owns=None, reconciled=True):
+    pass_profiler.begin_pass()
+    try:
+        await _check_pass(notify, owns, reconciled)
+    finally:
+        await pass_profiler.end_pass()
+
+
+async def _check_pass(notify, owns, reconciled):
+    stage = pass_profiler.stage
+    logger.info("🔍 Начало проверки транзакций...")
+    # Источники администратора и адреса из подписок чатов
+    with stage('db'):
+        subscription_index.reload()
+    sources = subscription_index.addresses()
+    if not sources:
+        logger.warning("📭 Нет адресов-источников для проверки. Добавьте адреса с помощью команды /addsource")
+        return
+    source_set = set(sources)
+
+    with stage('db'):
+        settings = get_settings()
+        label_registry.refresh(settings)
+        token_registry.refresh(settings)
+    # Метаданные новых минтов — один getMultipleAccounts, дальше из кэша
+    with stage('rpc'):
+        await refresh_token_metadata()
+    min_amount = float(settings['min_amount'])
+    max_amount = float(settings['max_amount'])
+    notify_all = settings.get('notify_all_transactions', 'true').lower() == 'true'
+
+    # Быстрые уведомления: подписи на уровне confirmed, финализацию сверяет бот
+    # (в том числе для находок воркеров, доставленных через --notifier)
+    optimistic = reconciled and settings.get('optimistic_notify', 'false').lower() == 'true'
+    commitment = 'confirmed' if optimistic else None
+
+    tracing = settings.get('trace_enabled', 'false').lower() == 'true'
+    trace_depth = int(settings.get('trace_depth', '2'))
+    trace_ttl = int(settings.get('trace_ttl', '3600'))
+    trace_max_nodes = int(settings.get('trace_max_nodes', '50'))
+
+    # Кошельки, добавленные трассировкой, проверяются вместе с источниками
+    watched = []
+    if tracing:
+        with stage('db'):
+            transfer_graph.expire()
+            # Лимит мог быть уменьшен через /settrace после последнего promote
+            transfer_graph.trim(trace_max_nodes)
+        watched = [addr for addr in transfer_graph.nodes if addr not in source_set]
+
+    addresses = sources + watched
+    if owns is not None:
+        addresses = [addr for addr in addresses if owns(addr)]
+
+    logger.info(f"⚙️ Настройки: min={min_amount}, max={max_amount}, notify_all={notify_all}")
+    logger.info(f"📦 Источников для проверки: {len(sources)}, узлов трассировки: {len(watched)}, "
+                f"в этом проходе: {len(addresses)}")
+
+    token_ranges = token_registry.ranges()
+    batches = []  # (источник, скачанные транзакции, задача разбора)
+    try:
+        for source_address in addresses:
+            # Состав воркеров мог измениться во время прохода
+            if owns is not None and not owns(source_address):
+                logger.info(f"↪️ Адрес {source_address} перешел к другому воркеру")
+                continue
+            logger.info(f"🔍 Проверка транзакций для адреса: {source_address}")
+            with stage('rpc'):
+                transactions = await get_outgoing_transactions(source_address, commitment=commitment)
+
+            if not transactions:
+                logger.info(f"📭 Нет новых транзакций для адреса {source_address}")
+                continue
+
+            logger.info(f"📄 Найдено транзакций: {len(transactions)}")
+
+            # Сначала скачиваем все новые транзакции, затем разбираем их одной пачкой:
+            # один вызов пула на источник вместо вызова на каждую транзакцию
+            pending = []
+            for tx in transactions:
+                signature = tx['signature']
+                slot_time = tx.get('blockTime', int(datetime.now().timestamp()))
+
+                # Пропускаем уже обработанные транзакции
+                with stage('db'):
+                    processed = is_transaction_processed(signature)
+                if processed:
+                    logger.debug(f"⏭️ Транзакция {signature} уже обработана")
+                    continue
+
+                # Получаем детали транзакции
+                with stage('rpc'):
+                    raw = await get_transaction_raw(signature)
+                if raw is None:
+                    logger.warning(f"⚠️ Не удалось получить детали транзакции {signature}")
+                    with stage('db'):
+                        mark_transaction_processed(signature)
+                    continue
+                pending.append((signature, slot_time, raw))
+
+            if not pending:
+                continue
+
+            # Анализируем транзакции
+            # Диапазон сумм источника — объединение фильтров всех его подписчиков
+            source_min, source_max = subscription_index.amount_range(source_address)
+            source_settings = dict(settings, min_amount=source_min, max_amount=source_max, token_ranges=token_ranges)
+            # Пачка разбирается в пуле, пока скачиваются следующие источники:
+            # так пул занят сразу несколькими пачками, а не одной за раз
+            decoding = asyncio.ensure_future(
+                decode_transactions([raw for _, _, raw in pending], source_address, source_settings)
+            )
+            batches.append((source_address, pending, decoding))
+
+        # Уведомления отправляются в порядке источников, после скачивания всех пачек
+        for source_address, pending, decoding in batches:
+            records = await decoding
+
+            for (signature, slot_time, _), record in zip(pending, records):
+                if record is None:
+                    logger.warning(f"⚠️ Не удалось получить детали транзакции {signature}")
+                    with stage('db'):
+                        mark_transaction_processed(signature)
+                    continue
+
+                found_transfer, recipient, amount, log_info, mint = record
+
+                # Проверяем, не уведомляли ли уже об этом кошельке
+                with stage('db'):
+                    if found_transfer and is_wallet_notified(recipient):
+                        found_transfer, log_info = False, "Кошелек уже был уведомлен"
+
+                if found_transfer:
+                    # Узел трассировки: глубина и корень цепочки
+                    node = transfer_graph.nodes.get(source_address)
+                    hop = (node['depth'] + 1, node['root']) if node else None
+
+                    # Граф переводов ведется только при включенной трассировке, иначе он растет без предела;
+                    # суммы в нем в SOL, поэтому переводы токенов в трассировку не попадают
+                    if tracing and mint is None:
+                        with stage('db'):
+                            transfer_graph.add_edge(source_address, recipient, amount, signature, slot_time)
+                            transfer_graph.touch(source_address, trace_ttl)
+                            depth, root = hop or (1, source_address)
+                            if depth <= trace_depth and recipient not in source_set:
+                                transfer_graph.promote(recipient, root, depth, trace_ttl, trace_max_nodes)
+
+                    # Отправляем уведомление
+                    with stage('notify'):
+                        try:
+                            success = await notify(
+                                recipient,
+                                amount,
+                                source_address,
+                                slot_time,
+                                hop=hop,
+                                signature=signature,
+                                token=mint
+                            )
+                        except DeliveryError as e:
+                            # Не помечаем транзакцию: иначе находка потеряется навсегда
+                            logger.error(f"❌ Находка не доставлена, транзакция {signature} "
+                                         f"будет проверена повторно: {e}")
+                            continue
+
+                    if success:
+                        root_source = hop[1] if hop else source_address
+                        with stage('db'):
+                            record_new_wallet(recipient, slot_time, amount,
+                                              label_registry.get(root_source) or root_source, mint)
+                        logger.info(f"✅ Уведомление успешно отправлено для кошелька {recipient}")
+                    else:
+                        logger.error(f"❌ Не удалось отправить уведомление для кошелька {recipient}")
+                else:
+                    logger.info(f"⏭️ {log_info}")
+
+                # Помечаем транзакцию как обработанную (кроме недоставленных находок)
+                with stage('db'):
+                    mark_transaction_processed(signature)
+                logger.info(f"✅ Транзакция {signature} обработана и помечена как processed")
+
+    finally:
+        # При ошибке прохода не оставляем висящих задач разбора
+        for _, _, decoding in batches:
+            decoding.cancel()
+
+    logger.info("✅ Проверка транзакций завершена")
+
+
+# Режим воркера: опрос своего шарда источников без Telegram
+async def run_worker(worker_id):
+    async def notify(wallet, amount, source, timestamp, hop=None, signature=None, token=None):
+        enqueue_detection(wallet, amount, source, timestamp, hop, worker_id, signature, token)
+        return True
+
+    members = None
+    ring = None
+
+    def update_ring():
+        nonlocal members, ring
+        worker_heartbeat(worker_id)
+        live = sorted(get_live_workers())
+        if live != members:
+            members, ring = live, HashRing(live)
+            logger.info(f"👷 Воркеры в кольце: {', '.join(live)}")
+
+    async def keep_alive():
+        # Lease продлевается и во время долгого прохода: иначе шард живого воркера заберут другие
+        while True:
+            await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+            try:
+                update_ring()
+            except sqlite3.Error as e:
+                logger.error(f"❌ Ошибка heartbeat воркера {worker_id}: {e}")
+
+    logger.info(f"👷 Воркер {worker_id} запущен, RPC: {SOLANA_RPC_URL}")
+    update_ring()
+    keeper = asyncio.create_task(keep_alive())
+    try:
+        while True:
+            transfer_graph.refresh()
+
+            try:
+                # Владелец проверяется перед каждым источником по текущему кольцу,
+                # поэтому вошедший посреди прохода воркер сразу забирает свою долю
+                await run_check_pass(notify, owns=lambda addr: ring.owner(addr) == worker_id)
+            except Exception as e:
+                logger.error(f"❌ Ошибка прохода воркера {worker_id}: {e}")
+
+            await asyncio.sleep(CHECK_INTERVAL)
+    finally:
+        keeper.cancel()
+        await pass_profiler.flush()
+        # Освобождаем шард сразу, не дожидаясь истечения lease
+        worker_unregister(worker_id)
+        logger.info(f"👷 Воркер {worker_id} остановлен")
+
+
+async def get_wallet_balance(address):
+    payload = {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "getBalance",
+        "params": [address]
+    }
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(SOLANA_RPC_URL, json=payload, timeout=10) as response:
+                if response.status != 200:
+                    logger.error(f"Ошибка получения баланса: HTTP {response.status}")
+                    return None
+                result = await response.json()
+                return result.get('result', {}).get('value', 0)
+    except Exception as e:
+        logger.error(f"Ошибка получения баланса для {address}: {e}")
+        return None
+
+
+# Вывод обнаруженных переводов в формате JSON Lines
+class JsonLinesSink:
+    """
+    Пишет по одной JSON-строке на каждый обнаруженный перевод.
+    Назначение: "-" (stdout), путь к файлу или "unix:/путь/к/сокету".
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.stream = None
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        if self.target == '-':
+            self.stream = sys.stdout
+        elif self.target.startswith('unix:'):
+            await self._connect()
+        else:
+            self.stream = open(self.target, 'a', encoding='utf-8')
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_unix_connection(self.target[len('unix:'):])
+
+    def _disconnect(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        if not self.target.startswith('unix:'):
+            self.stream.write(line)
+            self.stream.flush()
+            return
+
+        # Получатель мог закрыть сокет или перезапуститься: переподключаемся
+        # и повторяем запись один раз, иначе ошибка уходит вызывающему
+        for attempt in (1, 2):
+            try:
+                if self.writer is None or self.writer.is_closing() or self.reader.at_eof():
+                    self._disconnect()
+                    await self._connect()
+                    logger.info(f"🔌 Подключение к {self.target} восстановлено")
+                self.writer.write(line.encode('utf-8'))
+                await self.writer.drain()
+                return
+            except OSError:
+                self._disconnect()
+                if attempt == 2:
+                    raise
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        elif self.stream is not None and self.stream is not sys.stdout:
+            self.stream.close()
+
+
+# Headless-режим: проход проверки без Telegram, находки — в JSON Lines
+async def run_headless(output='-', once=False):
+    sink = JsonLinesSink(output)
+    await sink.open()
+
+    async def notify(wallet, amount, source, timestamp, hop=None, signature=None, token=None):
+        depth, root = hop or (None, None)
+        try:
+            await sink.write({
+                'signature': signature,
+                'wallet': wallet,
+                'wallet_label': label_registry.get(wallet),
+                'amount': amount,
+                'token': token,
+                'token_symbol': token_registry.symbol(token) if token else 'SOL',
+                'source': source,
+                'source_label': label_registry.get(source),
+                'timestamp': timestamp,
+                'hop_depth': depth,
+                'hop_root': root
+            })
+        except OSError as e:
+            raise DeliveryError(f"ошибка записи в {output}: {e}")
+        mark_wallet_notified(wallet)
+        return True
+
+    logger.info(f"🛰️ Headless-режим, вывод: {output}, RPC: {SOLANA_RPC_URL}")
+    try:
+        while True:
+            # Выброшенную сетью транзакцию из JSON Lines не отозвать, поэтому только finalized
+            await run_check_pass(notify, reconciled=False)
+            if once:
+                break
+            await asyncio.sleep(CHECK_INTERVAL)
+    finally:
+        await pass_profiler.flush()
+        await sink.close()
+
+
+# Общие параметры запуска для tracker.py и bot.py
+def add_common_args(parser):
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="идентификатор воркера (по умолчанию host-pid)")
+    parser.add_argument("--rpc-url", default=None, help="RPC endpoint Solana (например, локальный stub)")
+    parser.add_argument("--db", default=None, help="путь к базе SQLite (общей для всех воркеров)")
+    parser.add_argument("--decode-pool", type=int, nargs="?", const=0, default=None, metavar="N",
+                        help="разбирать транзакции в пуле из N процессов (без N — по числу ядер)")
+    parser.add_argument("--profile", type=int, default=0, metavar="N",
+                        help=f"профилировать первые N проходов проверки (отчет в лог, профиль в {PROFILE_DIR}/)")
+
+
+def configure(args):
+    global SOLANA_RPC_URL, DB_PATH
+
+    if args.rpc_url:
+        SOLANA_RPC_URL = args.rpc_url
+    if args.db:
+        DB_PATH = args.db
+
+    # Инициализация базы данных
+    init_db()
+
+    if args.decode_pool is not None:
+        start_decode_pool(args.decode_pool)
+
+    if args.profile > 0:
+        pass_profiler.start(args.profile)
+
+    # Загрузка графа переводов, узлов трассировки, меток адресов и отслеживаемых токенов
+    transfer_graph.load()
+    label_registry.reload()
+    token_registry.reload()
+
+
+def run_until_stopped(coro):
+    # SIGTERM (docker stop, systemd) завершает процесс так же, как Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(coro)
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Solana Wallet Tracker — headless-режим без Telegram")
+    parser.add_argument("--worker", action="store_true",
+                        help="опрашивать свой шард источников и складывать находки в БД для bot.py --notifier")
+    parser.add_argument("--output", default="-",
+                        help='куда писать JSON Lines: "-" (stdout), файл или unix:/путь/к/сокету')
+    parser.add_argument("--once", action="store_true", help="выполнить один проход проверки и выйти")
+    parser.add_argument("--import-labels", metavar="FILE",
+                        help="импортировать адреса-источники с метками из CSV/JSON и выйти")
+    add_common_args(parser)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    configure(args)
+
+    if args.import_labels:
+        with open(args.import_labels, encoding='utf-8') as f:
+            imported, invalid = import_labels(parse_labels(f.read(), args.import_labels))
+        print(f"Импортировано: {imported}, некорректных адресов: {len(invalid)}")
+        for address in invalid:
+            print(f"  {address!r}")
+        return
+
+    if args.worker:
+        run_until_stopped(run_worker(args.worker_id))
+    else:
+        run_until_stopped(run_headless(args.output, args.once))
+
+
+if __name__ == "__main__":
+    main()